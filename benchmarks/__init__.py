@@ -0,0 +1 @@
+"""巴法智能集成的离线基准测试"""
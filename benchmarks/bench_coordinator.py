@@ -0,0 +1,194 @@
+"""BemfaSmartCoordinator 与各平台的离线基准测试
+
+在仓库根目录运行::
+
+    python -m benchmarks.bench_coordinator --sizes 10 100 1000 10000
+
+需要安装 homeassistant 和 aiohttp。测试使用本地模拟服务器，不会访问巴法云。
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.bemfa_smart.const import DOMAIN, DEVICE_TYPE_OUTLET
+from custom_components.bemfa_smart.coordinator import BemfaSmartCoordinator
+from custom_components.bemfa_smart.registry import platforms_for_device_types
+
+from .fake_cloud import FakeBemfaCloud, make_devices
+
+async def async_create_entities(hass, coordinator, entry):
+    """与集成相同，只为账号中存在的设备类型调用平台的 async_setup_entry，并把状态写入替换为计数"""
+    entities = []
+    for name in platforms_for_device_types(coordinator.device_types):
+        platform = importlib.import_module(f"custom_components.bemfa_smart.{name}")
+        await platform.async_setup_entry(hass, entry, entities.extend)
+
+    writes = {"count": 0}
+
+    def count_write():
+        writes["count"] += 1
+
+    # 诊断传感器不属于任何设备，不参与分发计数
+    entities = [entity for entity in entities if hasattr(entity, "device_state")]
+    for entity in entities:
+        entity.hass = hass
+        entity.async_write_ha_state = count_write
+        coordinator.async_add_topic_listener(
+            entity.device_state.topic, entity._handle_coordinator_update
+        )
+    return entities, writes
+
+
+async def async_poll(coordinator):
+    """发起一次真实的homeRoom请求，连续测量时不复用最近的结果"""
+    coordinator._last_fetch_at = None
+    await coordinator.async_refresh()
+
+
+def instrument_dispatch(coordinator):
+    """记录每次分发耗时，必须在订阅实体之前调用"""
+    durations = []
+    dispatch = coordinator._async_dispatch_changes
+
+    def timed_dispatch():
+        start = time.perf_counter()
+        dispatch()
+        durations.append(time.perf_counter() - start)
+
+    coordinator._async_dispatch_changes = timed_dispatch
+    return durations
+
+
+async def async_run_size(hass, size, polls, change_ratio, commands, concurrency):
+    """对指定设备数量运行一轮基准测试"""
+    cloud = FakeBemfaCloud(make_devices(size), change_ratio=change_ratio)
+    await cloud.async_start()
+
+    entry = SimpleNamespace(
+        entry_id=f"bench_{size}", options={}, data={}, async_on_unload=lambda remove: None
+    )
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    coordinator = BemfaSmartCoordinator(hass, "bench", 30)
+    coordinator.home_room_url = cloud.home_room_url
+    coordinator.post_msg_url = cloud.post_msg_url
+    await coordinator.async_refresh()
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
+
+    dispatch_durations = instrument_dispatch(coordinator)
+    entities, writes = await async_create_entities(hass, coordinator, entry)
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    # 让初次刷新产生的变更集先分发完，再开始计时
+    coordinator._async_dispatch_changes()
+    dispatch_durations.clear()
+    writes["count"] = 0
+
+    changed_latency = []
+    for _ in range(polls):
+        start = time.perf_counter()
+        await async_poll(coordinator)
+        changed_latency.append(time.perf_counter() - start)
+    changed_writes = writes["count"]
+
+    cloud.change_ratio = 0.0
+    await async_poll(coordinator)
+    unchanged_latency = []
+    writes["count"] = 0
+    for _ in range(polls):
+        start = time.perf_counter()
+        await async_poll(coordinator)
+        unchanged_latency.append(time.perf_counter() - start)
+    unchanged_writes = writes["count"]
+
+    command_topics = coordinator.get_topics_by_type(DEVICE_TYPE_OUTLET)[:commands]
+    start = time.perf_counter()
+    results = await coordinator.async_send_batch(
+        [(topic, "on") for topic in command_topics], concurrency
+    )
+    command_elapsed = time.perf_counter() - start
+
+    await coordinator.async_shutdown()
+    await coordinator.async_close()
+    hass.data[DOMAIN].pop(entry.entry_id)
+    await cloud.async_stop()
+
+    return {
+        "devices": size,
+        "entities": len(entities),
+        "poll_ms": 1000 * sum(changed_latency) / max(len(changed_latency), 1),
+        "unchanged_poll_ms": 1000 * sum(unchanged_latency) / max(len(unchanged_latency), 1),
+        "dispatch_ms": 1000 * sum(dispatch_durations) / max(len(dispatch_durations), 1),
+        "writes_per_poll": changed_writes / max(polls, 1),
+        "unchanged_writes_per_poll": unchanged_writes / max(polls, 1),
+        "commands_per_s": len(results) / command_elapsed if command_elapsed else 0.0,
+        "command_failures": sum(1 for result in results if not result["success"]),
+        "bytes_per_device": memory / size,
+        "polls_skipped": coordinator.polls_skipped,
+    }
+
+
+def print_table(rows):
+    """以表格形式输出结果"""
+    columns = [
+        ("devices", "设备数", "{:d}"),
+        ("entities", "实体数", "{:d}"),
+        ("poll_ms", "轮询ms", "{:.2f}"),
+        ("unchanged_poll_ms", "无变化轮询ms", "{:.2f}"),
+        ("dispatch_ms", "分发ms", "{:.3f}"),
+        ("writes_per_poll", "写入/轮询", "{:.1f}"),
+        ("unchanged_writes_per_poll", "无变化写入/轮询", "{:.1f}"),
+        ("commands_per_s", "命令/s", "{:.1f}"),
+        ("bytes_per_device", "字节/设备", "{:.0f}"),
+    ]
+    print(" | ".join(title for _, title, _ in columns))
+    for row in rows:
+        print(" | ".join(fmt.format(row[key]) for key, _, fmt in columns))
+
+
+async def async_main(args):
+    """运行全部规模的基准测试"""
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        rows = []
+        try:
+            for size in args.sizes:
+                rows.append(await async_run_size(
+                    hass, size, args.polls, args.change_ratio, args.commands, args.concurrency
+                ))
+        finally:
+            await hass.async_stop(force=True)
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    else:
+        print_table(rows)
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="巴法智能集成离线基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--polls", type=int, default=10, help="每种场景的轮询次数")
+    parser.add_argument("--change-ratio", type=float, default=0.05, help="每次轮询状态变化的设备比例")
+    parser.add_argument("--commands", type=int, default=20, help="命令吞吐测试发送的命令数")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(async_main(args))
+
+
+if __name__ == "__main__":
+    main()
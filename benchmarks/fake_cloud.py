@@ -0,0 +1,254 @@
+"""本地模拟的巴法云服务器，用于离线基准测试"""
+
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+from custom_components.bemfa_smart.const import (
+    DEVICE_TYPE_LIGHT,
+    DEVICE_TYPE_AIR_CONDITIONER,
+    DEVICE_TYPE_FAN,
+    DEVICE_TYPE_CURTAIN,
+    DEVICE_TYPE_SENSOR,
+    DEVICE_TYPE_OUTLET,
+    DEVICE_TYPE_SWITCH,
+)
+from custom_components.bemfa_smart.push import parse_push_msg, parse_push_line
+
+HOME_ROOM_PATH = "/v4/app/v1/homeRoom"
+POST_MSG_PATH = "/vv/postmsg2"
+
+DEVICE_TYPES = [
+    DEVICE_TYPE_LIGHT,
+    DEVICE_TYPE_AIR_CONDITIONER,
+    DEVICE_TYPE_FAN,
+    DEVICE_TYPE_CURTAIN,
+    DEVICE_TYPE_SENSOR,
+    DEVICE_TYPE_OUTLET,
+    DEVICE_TYPE_SWITCH,
+]
+
+
+def make_msg(device_type, rng):
+    """生成与homeRoom格式一致的随机设备状态"""
+    if device_type == DEVICE_TYPE_AIR_CONDITIONER:
+        return {"on": rng.random() < 0.5, "mode": rng.randint(1, 5), "t": rng.randint(16, 32), "level": rng.randint(1, 3)}
+    if device_type == DEVICE_TYPE_FAN:
+        return {"on": rng.random() < 0.5, "level": rng.randint(1, 3), "shake": rng.randint(0, 1)}
+    if device_type == DEVICE_TYPE_CURTAIN:
+        return {"on": rng.random() < 0.5, "position": rng.randint(0, 100)}
+    if device_type == DEVICE_TYPE_SENSOR:
+        return {"t": round(rng.uniform(15, 30), 1), "h": round(rng.uniform(30, 80), 1)}
+    return {"on": rng.random() < 0.5}
+
+
+def make_devices(count, seed=0):
+    """生成覆盖全部设备类型的合成账号"""
+    rng = random.Random(seed)
+    now = int(time.time())
+    devices = []
+    for index in range(count):
+        device_type = DEVICE_TYPES[index % len(DEVICE_TYPES)]
+        device = {
+            "topic": f"{device_type}{index:05d}",
+            "name": f"{device_type} {index}",
+            "id": device_type,
+            "msg": make_msg(device_type, rng),
+            "unix": now,
+        }
+        if device_type == DEVICE_TYPE_SENSOR:
+            device["unit"] = ["℃", "%"]
+        devices.append(device)
+    return devices
+
+
+class FakeBemfaCloud:
+    """模拟 homeRoom 和 postmsg 接口的本地服务器"""
+
+    def __init__(self, devices, change_ratio=0.0, seed=0):
+        """初始化模拟服务器
+
+        change_ratio 为每次 homeRoom 请求前随机改变状态的设备比例。
+        """
+        self.devices = devices
+        self.change_ratio = change_ratio
+        self.response_code = 0 # homeRoom 返回的 code，回放接口错误时使用
+        self.home_room_requests = 0
+        self.post_msg_requests = 0
+        self._by_topic = {device["topic"]: device for device in devices}
+        self._rng = random.Random(seed)
+        self._runner = None
+        self.base_url = None
+
+    @property
+    def home_room_url(self):
+        """homeRoom 接口地址"""
+        return f"{self.base_url}{HOME_ROOM_PATH}"
+
+    @property
+    def post_msg_url(self):
+        """postmsg 接口地址"""
+        return f"{self.base_url}{POST_MSG_PATH}"
+
+    def set_devices(self, devices):
+        """替换全部设备，回放录制的响应时使用"""
+        self.devices = devices
+        self._by_topic = {device["topic"]: device for device in devices}
+
+    def mutate(self, ratio):
+        """随机改变一部分设备的状态"""
+        count = int(len(self.devices) * ratio)
+        now = int(time.time())
+        for device in self._rng.sample(self.devices, count):
+            device["msg"] = make_msg(device["id"], self._rng)
+            device["unix"] = now
+
+    async def _handle_home_room(self, request):
+        """返回全部设备"""
+        self.home_room_requests += 1
+        if self.change_ratio:
+            self.mutate(self.change_ratio)
+        if self.response_code:
+            return web.json_response({"code": self.response_code, "msg": "replayed error"})
+        body = json.dumps({"code": 0, "data": self.devices}, ensure_ascii=False)
+        return web.Response(text=body, content_type="application/json")
+
+    async def _handle_post_msg(self, request):
+        """接收命令并更新对应设备的状态"""
+        self.post_msg_requests += 1
+        form = await request.post()
+        device = self._by_topic.get(form.get("topic"))
+        if device is not None:
+            new_msg = parse_push_msg(device["id"], form.get("msg", ""), device["msg"])
+            if new_msg is not None:
+                device["msg"] = new_msg
+                device["unix"] = int(time.time())
+        return web.json_response({"code": 0, "message": "OK"})
+
+    async def async_start(self, host="127.0.0.1", port=0):
+        """启动服务器，port 为 0 时自动分配端口"""
+        app = web.Application()
+        app.router.add_get(HOME_ROOM_PATH, self._handle_home_room)
+        app.router.add_post(POST_MSG_PATH, self._handle_post_msg)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{bound_port}"
+
+    async def async_stop(self):
+        """停止服务器"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def parse_fields(line):
+    """把 ``cmd=1&uid=..&topic=..`` 形式的一行拆成字段字典"""
+    return dict(item.split("=", 1) for item in line.split("&") if "=" in item)
+
+
+class FakePushBroker:
+    """模拟巴法云TCP推送接口的本地服务器
+
+    支持 ``cmd=1`` 订阅、``ping`` 心跳，并可以向订阅了topic的连接推送 ``cmd=2`` 消息
+    或主动断开全部连接，用于检查推送客户端的解析和重连。
+    """
+
+    def __init__(self):
+        """初始化模拟服务器"""
+        self.connections = 0 # 累计建立的连接数
+        self.subscribe_requests = 0
+        self.pings = 0
+        self.messages_pushed = 0
+        self._clients = {} # writer -> {"uid": 私钥, "topics": 订阅的topic集合}
+        self._server = None
+        self.host = None
+        self.port = None
+
+    @property
+    def connected_clients(self):
+        """当前保持连接的客户端数"""
+        return len(self._clients)
+
+    @property
+    def subscribed_topics(self):
+        """当前所有连接订阅的topic"""
+        return set().union(*(client["topics"] for client in self._clients.values()))
+
+    async def async_start(self, host="127.0.0.1", port=0):
+        """启动服务器，port 为 0 时自动分配端口"""
+        self._server = await asyncio.start_server(self._async_handle_client, host, port)
+        self.host = host
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def _async_handle_client(self, reader, writer):
+        """处理一个客户端连接的订阅和心跳"""
+        self.connections += 1
+        client = self._clients[writer] = {"uid": "", "topics": set()}
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                line = raw.decode(errors="ignore").strip()
+                if line == "ping" or line.startswith("cmd=0"):
+                    self.pings += 1
+                    writer.write(b"cmd=0&res=1\r\n")
+                elif line.startswith("cmd=1&"):
+                    fields = parse_fields(line)
+                    self.subscribe_requests += 1
+                    client["uid"] = fields.get("uid", "")
+                    client["topics"] = {topic for topic in fields.get("topic", "").split(",") if topic}
+                    writer.write(b"cmd=1&res=1\r\n")
+                else:
+                    continue
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+    async def async_publish(self, topic, msg):
+        """向订阅了topic的连接推送一条消息，返回送达的连接数"""
+        if not topic or "&" in topic or "\n" in msg:
+            raise ValueError(f"无法推送的topic或消息: {topic!r} {msg!r}")
+        delivered = 0
+        for writer, client in list(self._clients.items()):
+            if topic not in client["topics"]:
+                continue
+            line = f"cmd=2&uid={client['uid']}&topic={topic}&msg={msg}"
+            if parse_push_line(line) != (topic, msg):
+                # 推送的格式必须能被客户端解析
+                raise ValueError(f"推送数据无法被客户端解析: {line}")
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+            delivered += 1
+        self.messages_pushed += delivered
+        return delivered
+
+    async def async_send_raw(self, line):
+        """向全部连接发送任意一行数据，用于检查客户端对异常数据的处理"""
+        for writer in list(self._clients):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+    async def async_drop_connections(self):
+        """断开全部连接，模拟服务器重启，返回断开的连接数"""
+        writers = list(self._clients)
+        for writer in writers:
+            writer.close()
+        return len(writers)
+
+    async def async_stop(self):
+        """断开连接并停止服务器"""
+        await self.async_drop_connections()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,171 @@
+"""用本地模拟的TCP推送服务器检查推送通道
+
+在仓库根目录运行::
+
+    python -m benchmarks.push_check --devices 50
+
+协调器先从模拟的 homeRoom 接口加载设备，再连接模拟的推送服务器。检查内容:
+订阅了全部topic、推送的消息经 parse_push_line 解析后更新到对应设备、
+异常数据被忽略，以及服务器断开后客户端重连、重新订阅并继续接收推送。
+需要安装 homeassistant 和 aiohttp，不会访问巴法云。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import time
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.bemfa_smart.const import (
+    DEVICE_TYPE_AIR_CONDITIONER,
+    DEVICE_TYPE_CURTAIN,
+    DEVICE_TYPE_FAN,
+    DEVICE_TYPE_SENSOR,
+    PUSH_RECONNECT_MIN,
+)
+from custom_components.bemfa_smart.coordinator import BemfaSmartCoordinator
+from custom_components.bemfa_smart.push import parse_push_msg
+
+from .fake_cloud import FakeBemfaCloud, FakePushBroker, make_devices
+
+WAIT_TIMEOUT = 5 # 等待单条推送生效的最长时间（秒）
+
+
+def make_push_msg(device):
+    """为设备生成一条会改变其状态的推送消息"""
+    device_type = device.device_type
+    if device_type == DEVICE_TYPE_SENSOR:
+        return f"#{(device.temperature or 0) + 1:.1f}#{(device.humidity or 0) + 1:.1f}#"
+    if device_type == DEVICE_TYPE_CURTAIN:
+        return f"on#{((device.position or 0) + 37) % 101}"
+    if device_type == DEVICE_TYPE_FAN:
+        return f"on#{(device.level or 0) % 3 + 1}#{1 - (device.shake or 0)}"
+    if device_type == DEVICE_TYPE_AIR_CONDITIONER:
+        return f"on#{(device.mode or 0) % 5 + 1}#{(device.target_temperature or 16) % 32 + 1}#1"
+    return "off" if device.on else "on"
+
+
+async def async_wait_for(predicate, timeout):
+    """等待条件成立，返回耗费的秒数，超时返回None"""
+    start = time.perf_counter()
+    while not predicate():
+        if time.perf_counter() - start > timeout:
+            return None
+        await asyncio.sleep(0.005)
+    return time.perf_counter() - start
+
+
+async def async_push_all(coordinator, broker, topics):
+    """逐个推送并等待协调器更新，返回 (成功数, 每条的延迟)"""
+    delivered = 0
+    latency = []
+    for topic in topics:
+        device = coordinator.get_device(topic)
+        msg = make_push_msg(device)
+        expected = parse_push_msg(device.device_type, msg, device.msg())
+        if not await broker.async_publish(topic, msg):
+            continue
+        elapsed = await async_wait_for(
+            lambda: coordinator.get_device(topic).msg() == expected, WAIT_TIMEOUT
+        )
+        if elapsed is not None:
+            delivered += 1
+            latency.append(elapsed)
+    return delivered, latency
+
+
+async def async_check(hass, size):
+    """运行一轮推送检查并返回结果"""
+    cloud = FakeBemfaCloud(make_devices(size))
+    await cloud.async_start()
+    broker = FakePushBroker()
+    await broker.async_start()
+
+    coordinator = BemfaSmartCoordinator(hass, "push_check", 30)
+    coordinator.home_room_url = cloud.home_room_url
+    coordinator.post_msg_url = cloud.post_msg_url
+    await coordinator.async_refresh()
+    topics = [device.topic for device in coordinator.data]
+
+    await coordinator.async_start_push(broker.host, broker.port)
+    connect_s = await async_wait_for(
+        lambda: coordinator.push_connected and broker.subscribed_topics == set(topics), WAIT_TIMEOUT
+    )
+    delivered, latency = await async_push_all(coordinator, broker, topics)
+
+    # 不是消息推送或格式错误的行应被忽略
+    received = coordinator.push_client.messages_received
+    for line in ("cmd=2&uid=push_check&topic=", "cmd=2&uid=push_check", "garbage", "cmd=1&res=1"):
+        await broker.async_send_raw(line)
+    await broker.async_publish(topics[0], "on")
+    await async_wait_for(lambda: coordinator.push_client.messages_received > received, WAIT_TIMEOUT)
+    ignored_ok = coordinator.push_client.messages_received == received + 1
+
+    # 服务器断开后客户端按退避重连并重新订阅
+    connections = broker.connections
+    await broker.async_drop_connections()
+    await async_wait_for(lambda: not coordinator.push_connected, WAIT_TIMEOUT)
+    reconnect_s = await async_wait_for(
+        lambda: broker.connections > connections and broker.subscribed_topics == set(topics),
+        PUSH_RECONNECT_MIN + WAIT_TIMEOUT,
+    )
+    redelivered, _ = await async_push_all(coordinator, broker, topics[:10])
+
+    await coordinator.async_shutdown()
+    await coordinator.async_close()
+    await broker.async_stop()
+    await cloud.async_stop()
+
+    result = {
+        "devices": size,
+        "connect_s": connect_s,
+        "subscribed": len(topics),
+        "pushed": len(topics),
+        "delivered": delivered,
+        "push_ms": 1000 * sum(latency) / len(latency) if latency else None,
+        "push_max_ms": 1000 * max(latency, default=0.0),
+        "ignored_malformed": ignored_ok,
+        "reconnect_s": reconnect_s,
+        "redelivered": redelivered,
+        "pings": broker.pings,
+    }
+    result["ok"] = (
+        connect_s is not None and delivered == len(topics) and ignored_ok
+        and reconnect_s is not None and redelivered == min(10, len(topics))
+    )
+    return result
+
+
+async def async_main(args):
+    """运行检查并输出结果"""
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        try:
+            result = await async_check(hass, args.devices)
+        finally:
+            await hass.async_stop(force=True)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        for key, value in result.items():
+            print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+    return result["ok"]
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="用本地模拟服务器检查巴法推送通道")
+    parser.add_argument("--devices", type=int, default=50, help="合成设备数量")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    if not asyncio.run(async_main(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
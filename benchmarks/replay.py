@@ -0,0 +1,149 @@
+"""回放录制的巴法API流量，离线分析分发和状态写入的开销
+
+在集成选项中开启“录制API流量”后，配置目录下会生成
+``bemfa_smart.<entry_id>.traffic.jsonl``。在仓库根目录运行::
+
+    python -m benchmarks.replay bemfa_smart.xxx.traffic.jsonl --speed 10
+
+``--speed`` 为回放倍速，1 为按录制时的节奏，0 为不等待、尽快回放。
+每条 homeRoom 记录都会让本地模拟服务器返回录制时的设备列表并触发一次刷新，
+命令记录按原来的时刻重新发送。相同的录制文件总是产生相同的请求序列。
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import tempfile
+import time
+from types import SimpleNamespace
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.bemfa_smart.const import DOMAIN
+from custom_components.bemfa_smart.coordinator import BemfaSmartCoordinator
+from custom_components.bemfa_smart.recorder import decode_traffic
+
+from .bench_coordinator import async_create_entities, instrument_dispatch
+from .fake_cloud import FakeBemfaCloud
+
+
+def load_events(path):
+    """读取录制文件，返回按时间排列的事件列表"""
+    with open(path, encoding="utf-8") as file:
+        events = list(decode_traffic(file))
+    events.sort(key=lambda event: event[0])
+    return events
+
+
+async def async_replay(hass, events, speed):
+    """把事件序列送入协调器并统计分发与写入开销"""
+    first_home = next((payload for _, kind, payload in events if kind == "home"), None)
+    if first_home is None:
+        raise ValueError("录制文件中没有 homeRoom 响应")
+    cloud = FakeBemfaCloud(copy.deepcopy(first_home))
+    await cloud.async_start()
+
+    entry = SimpleNamespace(
+        entry_id="replay", options={}, data={}, async_on_unload=lambda remove: None
+    )
+    coordinator = BemfaSmartCoordinator(hass, "replay", 30)
+    coordinator.home_room_url = cloud.home_room_url
+    coordinator.post_msg_url = cloud.post_msg_url
+    await coordinator.async_refresh()
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
+
+    dispatch_durations = instrument_dispatch(coordinator)
+    entities, writes = await async_create_entities(hass, coordinator, entry)
+    coordinator._async_dispatch_changes()
+    dispatch_durations.clear()
+    writes["count"] = 0
+
+    poll_latency = []
+    command_latency = []
+    command_mismatches = 0 # 回放结果与录制时不同的命令数
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    origin = events[0][0]
+
+    for offset, kind, payload in events:
+        if speed:
+            delay = started + (offset - origin) / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        start = time.perf_counter()
+        if kind == "cmd":
+            topic, msg, device_type, recorded_ok = payload
+            ok = await coordinator.async_send_command(topic, msg, device_type)
+            command_latency.append(time.perf_counter() - start)
+            command_mismatches += ok != recorded_ok
+            continue
+        if kind == "error":
+            cloud.response_code = payload
+        else:
+            cloud.response_code = 0
+            cloud.set_devices(copy.deepcopy(payload))
+        # 回放需要每条记录都产生一次真实请求，不复用最近的结果
+        coordinator._last_fetch_at = None
+        await coordinator.async_refresh()
+        poll_latency.append(time.perf_counter() - start)
+
+    elapsed = loop.time() - started
+    await coordinator.async_shutdown()
+    await coordinator.async_close()
+    hass.data[DOMAIN].pop(entry.entry_id)
+    await cloud.async_stop()
+
+    def mean_ms(values):
+        return 1000 * sum(values) / len(values) if values else 0.0
+
+    return {
+        "events": len(events),
+        "devices": len(coordinator.data or []),
+        "entities": len(entities),
+        "elapsed_s": elapsed,
+        "polls": len(poll_latency),
+        "poll_ms": mean_ms(poll_latency),
+        "polls_skipped": coordinator.polls_skipped,
+        "dispatches": len(dispatch_durations),
+        "dispatch_ms": mean_ms(dispatch_durations),
+        "dispatch_max_ms": 1000 * max(dispatch_durations, default=0.0),
+        "writes": writes["count"],
+        "writes_per_poll": writes["count"] / max(len(poll_latency), 1),
+        "commands": len(command_latency),
+        "command_ms": mean_ms(command_latency),
+        "command_mismatches": command_mismatches,
+    }
+
+
+async def async_main(args):
+    """回放录制文件并输出统计"""
+    events = load_events(args.log)
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        try:
+            result = await async_replay(hass, events, args.speed)
+        finally:
+            await hass.async_stop(force=True)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        for key, value in result.items():
+            print(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="回放录制的巴法API流量")
+    parser.add_argument("log", help="录制文件路径")
+    parser.add_argument("--speed", type=float, default=0, help="回放倍速，0 表示不等待")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(async_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,31 @@
 """巴法智能集成的初始化"""
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.storage import Store
 import logging
 
-from .const import DOMAIN, CONF_USER, CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL
-from .coordinator import BemfaSmartCoordinator
+from .const import (
+    DOMAIN, CONF_USER, CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL,
+    CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL,
+    CONF_PUSH_MODE, DEFAULT_PUSH_MODE, SNAPSHOT_STORAGE_VERSION,
+    CONF_COMMAND_OUTBOX, DEFAULT_COMMAND_OUTBOX, CONF_STALE_THRESHOLDS,
+    CONF_DISPATCH_TIERS, CONF_TRAFFIC_RECORDER, DEFAULT_TRAFFIC_RECORDER
+)
+from .coordinator import BemfaSmartCoordinator, snapshot_storage_key
+from .hub import async_get_hub
+from .outbox import CommandOutbox
+from .recorder import traffic_log_path
+from .registry import platforms_for_device_types
+from .services import async_setup_services
 
 _LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup(hass: HomeAssistant, config: dict):
     """设置巴法智能集成"""
+    async_setup_services(hass)
     return True
 
 
@@ -20,29 +34,93 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """从配置项设置巴法智能集成"""
     user = entry.data[CONF_USER]
     scan_interval = entry.options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
+    max_scan_interval = entry.options.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL)
 
+    # 多个账号共用一个调度中心，统一并发、速率预算和轮询时刻
+    hub = async_get_hub(hass)
     coordinator = BemfaSmartCoordinator(
         hass,
         user,
-        scan_interval
+        scan_interval,
+        max_scan_interval,
+        entry_id=entry.entry_id,
+        stale_thresholds=entry.options.get(CONF_STALE_THRESHOLDS),
+        dispatch_tiers=entry.options.get(CONF_DISPATCH_TIERS),
+        hub=hub
     )
+    entry.async_on_unload(hub.async_register(entry.entry_id))
 
-    await coordinator.async_config_entry_first_refresh()
+    if entry.options.get(CONF_TRAFFIC_RECORDER, DEFAULT_TRAFFIC_RECORDER):
+        # 录制从第一次请求开始，文件可用 benchmarks/replay.py 离线回放
+        coordinator.async_enable_recorder(traffic_log_path(hass, entry.entry_id))
+
+    if entry.options.get(CONF_COMMAND_OUTBOX, DEFAULT_COMMAND_OUTBOX):
+        # 先恢复队列，第一次成功轮询后即开始重发
+        await coordinator.async_enable_outbox()
+
+    # 有缓存快照时直接用它创建实体，不再等待云端响应
+    snapshot_loaded = await coordinator.async_load_snapshot()
+    if not snapshot_loaded:
+        await coordinator.async_config_entry_first_refresh()
 
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = coordinator
 
-    await hass.config_entries.async_forward_entry_setups(entry, ["light", "climate", "fan", "cover", "sensor", "switch"])
+    @callback
+    def _async_devices_changed(added, removed):
+        """加载新增设备类型所需的平台，并移除账号中已消失的设备"""
+        new_types = {coordinator.get_device(topic).device_type for topic in added}
+        missing = [
+            platform for platform in platforms_for_device_types(new_types)
+            if platform not in coordinator.loaded_platforms
+        ]
+        if missing:
+            # 平台加载时会为该类型的全部设备创建实体
+            _LOGGER.info("发现新的设备类型，加载平台: %s", missing)
+            coordinator.loaded_platforms.extend(missing)
+            entry.async_create_task(hass, hass.config_entries.async_forward_entry_setups(entry, missing))
+
+        # 消失设备从设备注册表移除，其实体随之删除
+        device_registry = dr.async_get(hass)
+        for topic in removed:
+            device = device_registry.async_get_device(identifiers={(DOMAIN, topic)})
+            if device is not None:
+                _LOGGER.info("设备 %s 已从巴法账号中移除，删除对应实体", topic)
+                device_registry.async_update_device(device.id, remove_config_entry_id=entry.entry_id)
+
+    entry.async_on_unload(coordinator.async_add_device_listener(_async_devices_changed))
+
+    # 只加载账号中实际存在的设备类型所需的平台
+    coordinator.loaded_platforms = platforms_for_device_types(coordinator.device_types)
+    await hass.config_entries.async_forward_entry_setups(entry, coordinator.loaded_platforms)
+
+    if snapshot_loaded:
+        # 实时数据在后台获取，到达后清除实体的过期标记
+        entry.async_create_background_task(
+            hass, coordinator.async_refresh(), "bemfa_smart_initial_refresh"
+        )
+
+    if entry.options.get(CONF_PUSH_MODE, DEFAULT_PUSH_MODE):
+        await coordinator.async_start_push()
+    else:
+        # 与其他账号错开轮询，避免多个账号在同一时刻集中请求
+        coordinator.async_stagger_next_poll()
 
     return True
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """卸载配置项"""
-    unload_ok = await hass.config_entries.async_unload_platforms(entry, ["light", "climate", "fan", "cover", "sensor", "switch"])
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, coordinator.loaded_platforms)
     if unload_ok:
-        coordinator = hass.data[DOMAIN][entry.entry_id]
         await coordinator.async_close()
         hass.data[DOMAIN].pop(entry.entry_id)
 
-    return unload_ok
\ No newline at end of file
+    return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """删除配置项时清理缓存的设备快照和待发命令"""
+    await Store(hass, SNAPSHOT_STORAGE_VERSION, snapshot_storage_key(entry.entry_id)).async_remove()
+    await CommandOutbox(hass, entry.entry_id).async_remove()
\ No newline at end of file
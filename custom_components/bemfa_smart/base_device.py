@@ -1,36 +1,97 @@
 """巴法智能设备的基础类"""
 
+from homeassistant.core import callback
 from homeassistant.helpers.entity import Entity
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.helpers.update_coordinator import BaseCoordinatorEntity, CoordinatorEntity
 from .const import DOMAIN
 
 
+@callback
+def async_setup_device_entities(coordinator, config_entry, async_add_entities, factories):
+    """为平台负责的设备类型创建实体，并在账号新增设备时动态添加
+
+    factories 为 设备类型 -> 工厂函数，工厂函数接收一个设备状态，返回该设备对应的实体列表。
+    """
+    known_topics = set() # 本平台已创建实体的topic
+
+    @callback
+    def _async_add(devices):
+        entities = []
+        for device_state in devices:
+            if device_state.topic in known_topics:
+                continue
+            device_entities = factories[device_state.device_type](device_state)
+            if device_entities:
+                known_topics.add(device_state.topic)
+                entities.extend(device_entities)
+        if entities:
+            async_add_entities(entities)
+
+    @callback
+    def _async_devices_changed(added, removed):
+        # 消失设备的实体由设备注册表删除，重新出现时需要再次创建
+        known_topics.difference_update(removed)
+        devices = [coordinator.get_device(topic) for topic in added]
+        _async_add([
+            device_state for device_state in devices
+            if device_state is not None and device_state.device_type in factories
+        ])
+
+    # 协调器已按类型索引设备，这里只取本平台负责的类型，不再扫描全部设备
+    _async_add([
+        device_state
+        for device_type in factories
+        for device_state in coordinator.get_devices_by_type(device_type)
+    ])
+    config_entry.async_on_unload(coordinator.async_add_device_listener(_async_devices_changed))
+
+
 class BemfaSmartEntity(CoordinatorEntity, Entity):
     """巴法智能设备的基础实体类"""
 
-    def __init__(self, coordinator, config_entry, device_data):
+    def __init__(self, coordinator, config_entry, device_state):
         """初始化基础实体"""
         super().__init__(coordinator)
         self.config_entry = config_entry
-        self.device_data = device_data
-        self._attr_unique_id = f"bemfa_{device_data['topic']}"
-        self._attr_name = device_data['name']
+        self.device_state = device_state
+        self._attr_unique_id = f"bemfa_{device_state.topic}"
+        self._attr_name = device_state.name
         self._attr_device_info = {
-            "identifiers": {(DOMAIN, device_data['topic'])},
-            "name": device_data['name'],
+            "identifiers": {(DOMAIN, device_state.topic)},
+            "name": device_state.name,
             "manufacturer": "巴法智能",
-            "model": f"Bemfa Device ({device_data['id']})",
+            "model": f"Bemfa Device ({device_state.device_type})",
         }
 
     @property
     def available(self):
         """设备是否可用"""
-        # 可以根据最后更新时间判断设备是否离线
-        last_updated = self.device_data.get("unix", 0)
-        # 如果设备超过10分钟未更新，视为不可用
-        # 并且协调器本身也必须成功更新过
-        return (self.coordinator.last_update_success and 
-                (self.hass.loop.time() - last_updated) < 600)
+        # 协调器必须成功更新过，且设备未超过该类型的离线阈值
+        # 离线状态由协调器的定时器维护，这里只做查询
+        return (self.coordinator.api_available and
+                not self.coordinator.is_stale(self.device_state.topic))
+
+    @property
+    def extra_state_attributes(self):
+        """额外的状态属性"""
+        if self.coordinator.snapshot_stale:
+            # 状态来自缓存快照，尚未被实时轮询确认
+            return {"stale": True}
+        return None
+
+    async def async_added_to_hass(self):
+        """当实体添加到Home Assistant时调用。"""
+        # 跳过CoordinatorEntity的全局监听，改为只订阅自身topic的变化
+        await super(BaseCoordinatorEntity, self).async_added_to_hass()
+        self.async_on_remove(
+            self.coordinator.async_add_topic_listener(
+                self.device_state.topic, self._handle_coordinator_update
+            )
+        )
+        # 同一设备可能对应多个实体（如空调和空调开关），登记后可共享乐观状态
+        self.async_on_remove(
+            self.coordinator.async_register_topic_entity(self.device_state.topic, self)
+        )
 
     def update_device_state(self):
         """更新设备状态数据"""
@@ -38,11 +99,24 @@ class BemfaSmartEntity(CoordinatorEntity, Entity):
         if self.coordinator.data is None:
             return
 
-        # 从协调器最新的数据中找到当前设备的最新状态
-        self.device_data = next(
-            (device for device in self.coordinator.data if device['topic'] == self.device_data['topic']),
-            self.device_data
-        )
+        # 通过协调器的topic索引找到当前设备的最新状态
+        device = self.coordinator.get_device(self.device_state.topic)
+        if device is not None:
+            self.device_state = device
+
+    @callback
+    def async_set_optimistic_state(self, device_state):
+        """命令发送成功后更新自身状态，并同步给同一设备的其他实体"""
+        self.device_state = device_state
+        self.async_write_ha_state()
+        self.coordinator.async_share_state(self, device_state)
+
+    @callback
+    def async_apply_shared_state(self, device_state):
+        """应用同一设备的其他实体产生的乐观状态"""
+        self.device_state = device_state
+        self._update_state()
+        self.async_write_ha_state()
 
     def _handle_coordinator_update(self) -> None:
         """处理协调器更新的数据。"""
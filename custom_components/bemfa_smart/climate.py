@@ -11,20 +11,20 @@ from homeassistant.const import (
     UnitOfTemperature
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, Event, EventStateChangedData, State, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_state_change_event
 import logging
 
 from .const import (
     DOMAIN,
     DEVICE_TYPE_AIR_CONDITIONER,
-    ATTR_ON,
     ATTR_TEMPERATURE
 )
 # 这里不再从 .const 导入 CONF_TEMP_SENSOR_ENTITY_ID
 # from .config_flow import CONF_TEMP_SENSOR_ENTITY_ID # 也不从config_flow导入，直接使用字符串键
 
-from .base_device import BemfaSmartEntity
+from .base_device import BemfaSmartEntity, async_setup_device_entities
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -32,9 +32,9 @@ _LOGGER = logging.getLogger(__name__)
 class BemfaAirConditioner(BemfaSmartEntity, ClimateEntity):
     """巴法智能空调设备"""
 
-    def __init__(self, coordinator, config_entry, device_data):
+    def __init__(self, coordinator, config_entry, device_state):
         """初始化空调设备"""
-        super().__init__(coordinator, config_entry, device_data)
+        super().__init__(coordinator, config_entry, device_state)
         self._attr_hvac_modes = [
             HVACMode.OFF,
             HVACMode.AUTO,
@@ -62,7 +62,8 @@ class BemfaAirConditioner(BemfaSmartEntity, ClimateEntity):
 
         linked_sensors = config_entry.options.get("linked_sensors", {})
         # 直接使用字符串 "temp_sensor_entity_id" 作为键，因为它不再是导入的常量
-        self._current_temp_sensor_entity_id = linked_sensors.get(device_data['topic'])
+        self._current_temp_sensor_entity_id = linked_sensors.get(device_state.topic)
+        self._linked_temperature = None # 关联传感器最近一次的有效温度
 
         if not self._current_temp_sensor_entity_id:
             _LOGGER.warning("未为空调 %s 配置外部温度传感器，将使用目标温度作为当前温度。", self.name)
@@ -72,11 +73,53 @@ class BemfaAirConditioner(BemfaSmartEntity, ClimateEntity):
     async def async_added_to_hass(self):
         """当实体添加到Home Assistant时调用。"""
         await super().async_added_to_hass()
-        if not hasattr(self.coordinator, 'climate_entities'):
-            self.coordinator.climate_entities = []
-        self.coordinator.climate_entities.append(self)
+        if self._current_temp_sensor_entity_id:
+            # 订阅关联传感器的状态变化，不再在每次轮询时查询
+            self._linked_temperature = self._parse_sensor_temperature(
+                self.hass.states.get(self._current_temp_sensor_entity_id)
+            )
+            self.async_on_remove(
+                async_track_state_change_event(
+                    self.hass,
+                    [self._current_temp_sensor_entity_id],
+                    self._async_linked_sensor_changed,
+                )
+            )
         self._update_state()
 
+    def _parse_sensor_temperature(self, sensor_state: State | None):
+        """从传感器状态中解析温度，无效时返回None"""
+        if sensor_state is None or sensor_state.state in ('unavailable', 'unknown', None, ''):
+            _LOGGER.warning("无法从传感器 %s 获取有效温度数据（状态: '%s'），使用目标温度作为当前温度。",
+                            self._current_temp_sensor_entity_id, sensor_state.state if sensor_state else 'None/Invalid')
+            return None
+        try:
+            return float(sensor_state.state)
+        except (ValueError, TypeError) as e:
+            _LOGGER.error("传感器 %s 的温度数据格式错误（错误: %s），使用目标温度作为当前温度。",
+                          self._current_temp_sensor_entity_id, e)
+            return None
+
+    @callback
+    def _async_linked_sensor_changed(self, event: Event[EventStateChangedData]) -> None:
+        """关联的温度传感器状态变化时立即更新当前温度"""
+        temperature = self._parse_sensor_temperature(event.data["new_state"])
+        if temperature == self._linked_temperature:
+            return
+        self._linked_temperature = temperature
+        if self._attr_hvac_mode == HVACMode.OFF:
+            # 关机时不显示当前温度，开机后的下一次状态更新会使用最新值
+            return
+        self._attr_current_temperature = self._current_temperature()
+        _LOGGER.debug("关联传感器 %s 温度变化: %s", self._current_temp_sensor_entity_id, temperature)
+        self.async_write_ha_state()
+
+    def _current_temperature(self):
+        """返回当前温度：优先使用关联传感器，否则使用目标温度"""
+        if self._linked_temperature is not None:
+            return self._linked_temperature
+        return self._attr_target_temperature
+
     @property
     def hvac_mode(self) -> HVACMode | None:
         """返回当前HVAC模式。"""
@@ -89,12 +132,12 @@ class BemfaAirConditioner(BemfaSmartEntity, ClimateEntity):
 
     def _update_state(self):
         """更新空调状态。现在会根据API的on/off状态来更新HVAC模式。"""
-        msg = self.device_data['msg']
-        is_on_from_api = msg.get(ATTR_ON, False)
+        device_state = self.device_state
+        is_on_from_api = bool(device_state.on)
 
-        api_mode_code = msg.get('mode')
-        api_target_temp = msg.get('t')
-        api_fan_speed_code = msg.get('level')
+        api_mode_code = device_state.mode
+        api_target_temp = device_state.target_temperature
+        api_fan_speed_code = device_state.level
 
         if not is_on_from_api:
             self._attr_hvac_mode = HVACMode.OFF
@@ -117,26 +160,8 @@ class BemfaAirConditioner(BemfaSmartEntity, ClimateEntity):
         self._attr_target_temperature = self._internal_target_temperature
         self._attr_fan_mode = self._internal_fan_mode
 
-        if self._current_temp_sensor_entity_id:
-            try:
-                if self.hass:
-                    sensor_state = self.hass.states.get(self._current_temp_sensor_entity_id)
-                    if sensor_state and sensor_state.state not in ('unavailable', 'unknown', None, ''):
-                        temp_val = float(sensor_state.state)
-                        self._attr_current_temperature = temp_val
-                        _LOGGER.debug("_update_state: 从传感器 %s 获取实际温度: %s", self._current_temp_sensor_entity_id, self._attr_current_temperature)
-                    else:
-                        self._attr_current_temperature = self._attr_target_temperature
-                        _LOGGER.warning("_update_state: 无法从传感器 %s 获取有效温度数据（状态: '%s'），使用目标温度作为当前温度。", self._current_temp_sensor_entity_id, sensor_state.state if sensor_state else 'None/Invalid')
-                else:
-                    self._attr_current_temperature = self._attr_target_temperature
-                    _LOGGER.warning("_update_state: self.hass 不可用，无法获取传感器 %s 的数据，使用目标温度作为当前温度。", self._current_temp_sensor_entity_id)
-            except (ValueError, TypeError) as e:
-                self._attr_current_temperature = self._attr_target_temperature
-                _LOGGER.error("_update_state: 传感器 %s 的温度数据格式错误（错误: %s），使用目标温度作为当前温度。", self._current_temp_sensor_entity_id, e)
-        else:
-            self._attr_current_temperature = self._attr_target_temperature
-            _LOGGER.debug("_update_state: 未指定实际温度传感器，使用目标温度作为当前温度。")
+        # 关联传感器的温度由状态变化事件维护，这里只读取缓存值
+        self._attr_current_temperature = self._current_temperature()
 
         _LOGGER.debug(
             "_update_state: 空调实体内部状态。模式: %s, 目标温度: %s, 实际温度: %s, 风速模式: %s",
@@ -214,6 +239,17 @@ class BemfaAirConditioner(BemfaSmartEntity, ClimateEntity):
         msg = f"on#{mode_code}#{int(target_temp)}#{fan_speed_code}"
         return msg
 
+    def _commanded_device_state(self):
+        """根据内部存储状态生成命令发送成功后的设备状态，供空调开关同步"""
+        if self._internal_hvac_mode == HVACMode.OFF:
+            return self.device_state.replace(on=False)
+        return self.device_state.replace(
+            on=True,
+            mode=self._hvac_to_mode(self._internal_hvac_mode),
+            target_temperature=self._internal_target_temperature,
+            level=self._fan_mode_to_speed_code(self._internal_fan_mode),
+        )
+
     @property
     def device_type(self):
         """返回设备类型"""
@@ -236,17 +272,17 @@ class BemfaAirConditioner(BemfaSmartEntity, ClimateEntity):
             temperature = self._attr_max_temp
             _LOGGER.warning("async_set_temperature: 设置温度高于最大值 %s，已调整为 %s。", self._attr_max_temp, temperature)
 
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
 
         self._internal_target_temperature = int(temperature)
         self._attr_target_temperature = self._internal_target_temperature
 
         msg_command = self._generate_command_msg()
         _LOGGER.debug("async_set_temperature: 发送命令: %s 到主题: %s", msg_command, topic)
-        success = await self.coordinator.async_send_command(topic, msg_command)
+        success = await self.coordinator.async_send_command_debounced(topic, msg_command)
 
         if success:
-            self.async_write_ha_state()
+            self.async_set_optimistic_state(self._commanded_device_state())
             _LOGGER.debug("async_set_temperature: 命令发送成功，HA状态已更新。目标温度: %s", self._internal_target_temperature)
         else:
             _LOGGER.error("async_set_temperature: 发送设置温度命令失败！")
@@ -254,7 +290,7 @@ class BemfaAirConditioner(BemfaSmartEntity, ClimateEntity):
     async def async_set_hvac_mode(self, hvac_mode):
         """设置空调的HVAC模式 (包括开关)"""
         _LOGGER.debug("async_set_hvac_mode: 调用模式: %s", hvac_mode)
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
 
         self._internal_hvac_mode = hvac_mode
         self._attr_hvac_mode = self._internal_hvac_mode
@@ -264,11 +300,7 @@ class BemfaAirConditioner(BemfaSmartEntity, ClimateEntity):
         success = await self.coordinator.async_send_command(topic, msg_command)
 
         if success:
-            self.async_write_ha_state()
-            if hvac_mode == HVACMode.OFF:
-                for entity in self.coordinator.get_climate_entities_for_topic(topic):
-                    if entity.device_data['msg'].get(ATTR_ON, False):
-                        pass
+            self.async_set_optimistic_state(self._commanded_device_state())
             _LOGGER.debug("async_set_hvac_mode: 命令发送成功，HA状态已更新。")
         else:
             _LOGGER.error("async_set_hvac_mode: 发送设置模式命令失败！")
@@ -280,7 +312,7 @@ class BemfaAirConditioner(BemfaSmartEntity, ClimateEntity):
             _LOGGER.warning("async_set_fan_mode: 不支持的风扇模式: %s", fan_mode)
             return
 
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         self._internal_fan_mode = fan_mode
         self._attr_fan_mode = self._internal_fan_mode
 
@@ -289,7 +321,7 @@ class BemfaAirConditioner(BemfaSmartEntity, ClimateEntity):
         success = await self.coordinator.async_send_command(topic, msg_command)
 
         if success:
-            self.async_write_ha_state()
+            self.async_set_optimistic_state(self._commanded_device_state())
             _LOGGER.debug("async_set_fan_mode: 命令发送成功，HA状态已更新。")
         else:
             _LOGGER.error("async_set_fan_mode: 发送设置风扇模式命令失败！")
@@ -303,10 +335,8 @@ async def async_setup_entry(
     """设置巴法智能空调平台"""
     coordinator = hass.data[DOMAIN][config_entry.entry_id]
 
-    entities = []
-    for device_data in coordinator.data:
-        if device_data.get('id') == DEVICE_TYPE_AIR_CONDITIONER:
-            entities.append(BemfaAirConditioner(coordinator, config_entry, device_data))
-
-    if entities:
-        async_add_entities(entities)
\ No newline at end of file
+    async_setup_device_entities(
+        coordinator, config_entry, async_add_entities, {
+            DEVICE_TYPE_AIR_CONDITIONER: lambda device_state: [BemfaAirConditioner(coordinator, config_entry, device_state)],
+        }
+    )
\ No newline at end of file
@@ -10,10 +10,20 @@ import logging
 
 from .const import (
     CONF_USER, DOMAIN, NAME, CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL,
+    CONF_PUSH_MODE, DEFAULT_PUSH_MODE,
+    CONF_COMMAND_OUTBOX, DEFAULT_COMMAND_OUTBOX,
+    CONF_TRAFFIC_RECORDER, DEFAULT_TRAFFIC_RECORDER,
+    CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL,
     # 移除 CONF_TEMP_SENSOR_ENTITY_ID 的导入
     CONF_FAN_SPEED_LEVELS, DEFAULT_FAN_SPEED_LEVELS,
-    DEVICE_TYPE_FAN # 导入风扇设备类型
+    DEVICE_TYPE_FAN, # 导入风扇设备类型
+    DEVICE_TYPE_AIR_CONDITIONER,
+    DEVICE_TYPE_CURTAIN,
+    CONF_STALE_THRESHOLDS, DEFAULT_STALE_THRESHOLDS,
+    CONF_CURTAIN_TRAVEL_TIMES, DEFAULT_CURTAIN_TRAVEL_TIME,
+    CONF_DISPATCH_TIERS
 )
+from .registry import DEVICE_TYPE_PLATFORMS
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -25,6 +35,10 @@ CONF_AC_TOPIC_TO_CONFIGURE = "ac_topic_to_configure"
 CONF_FAN_TOPIC_TO_CONFIGURE = "fan_topic_to_configure"
 CONF_FAN_SPECIFIC_SPEED_LEVELS = "fan_specific_speed_levels"
 
+# 窗帘运行时间配置
+CONF_CURTAIN_TOPIC_TO_CONFIGURE = "curtain_topic_to_configure"
+CONF_CURTAIN_TRAVEL_TIME = "curtain_travel_time"
+
 
 class BemfaSmartConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """巴法智能集成的配置流程处理"""
@@ -74,24 +88,32 @@ class BemfaSmartOptionsFlowHandler(config_entries.OptionsFlow):
         """初始化选项流"""
         self.config_entry = config_entry
         self.options = dict(config_entry.options)
+        self.coordinator = None
         self.coordinator_data = None
         self.current_ac_topic = None
         self.current_ac_name = None
         self.current_fan_topic = None
         self.current_fan_name = None
+        self.current_curtain_topic = None
+        self.current_curtain_name = None
 
     async def async_step_init(self, user_input=None):
         """管理选项的初始步骤：选择扫描间隔和要配置的设备类型"""
         _LOGGER.debug("async_step_init called with user_input: %s", user_input)
 
-        coordinator = self.hass.data[DOMAIN][self.config_entry.entry_id]
-        await coordinator.async_refresh()
-        self.coordinator_data = coordinator.data
+        self.coordinator = self.hass.data[DOMAIN][self.config_entry.entry_id]
+        if self.coordinator.data is None:
+            # 设备列表由定时轮询维护，只有尚未获取过数据时才需要刷新
+            await self.coordinator.async_refresh()
+        self.coordinator_data = self.coordinator.data
 
         menu_options = {
-            "global_settings": "全局设置 (扫描间隔)",
+            "global_settings": "全局设置 (扫描间隔、推送模式)",
             "configure_ac_sensors": "配置空调温度传感器",
             "configure_fan_levels": "配置风扇挡位数量",
+            "configure_curtain_travel": "配置窗帘全程运行时间",
+            "configure_stale_thresholds": "配置设备离线判定时间",
+            "configure_dispatch_tiers": "配置各类设备的刷新间隔",
             "finish": "完成并保存配置",
         }
 
@@ -99,6 +121,10 @@ class BemfaSmartOptionsFlowHandler(config_entries.OptionsFlow):
             choice = user_input.get("menu_choice")
             if choice == "global_settings":
                 self.options[CONF_SCAN_INTERVAL] = user_input.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
+                self.options[CONF_MAX_SCAN_INTERVAL] = user_input.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL)
+                self.options[CONF_PUSH_MODE] = user_input.get(CONF_PUSH_MODE, DEFAULT_PUSH_MODE)
+                self.options[CONF_COMMAND_OUTBOX] = user_input.get(CONF_COMMAND_OUTBOX, DEFAULT_COMMAND_OUTBOX)
+                self.options[CONF_TRAFFIC_RECORDER] = user_input.get(CONF_TRAFFIC_RECORDER, DEFAULT_TRAFFIC_RECORDER)
                 # 直接保存更新，并返回主菜单，而不是停留在同一个菜单
                 self.async_create_entry(title="", data=self.options)
                 return self.async_show_form(step_id="init", data_schema=self._get_init_schema(menu_options), errors=None)
@@ -106,6 +132,12 @@ class BemfaSmartOptionsFlowHandler(config_entries.OptionsFlow):
                 return await self.async_step_select_ac_for_sensor()
             elif choice == "configure_fan_levels":
                 return await self.async_step_select_fan_for_levels()
+            elif choice == "configure_curtain_travel":
+                return await self.async_step_select_curtain_for_travel()
+            elif choice == "configure_stale_thresholds":
+                return await self.async_step_stale_thresholds()
+            elif choice == "configure_dispatch_tiers":
+                return await self.async_step_dispatch_tiers()
             elif choice == "finish":
                 return self.async_create_entry(title="", data=self.options)
 
@@ -129,6 +161,22 @@ class BemfaSmartOptionsFlowHandler(config_entries.OptionsFlow):
                 CONF_SCAN_INTERVAL,
                 default=self.options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
             ): vol.All(vol.Coerce(int), vol.Range(min=1, max=60)),
+            vol.Optional(
+                CONF_MAX_SCAN_INTERVAL,
+                default=self.options.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=3600)),
+            vol.Optional(
+                CONF_PUSH_MODE,
+                default=self.options.get(CONF_PUSH_MODE, DEFAULT_PUSH_MODE)
+            ): bool,
+            vol.Optional(
+                CONF_COMMAND_OUTBOX,
+                default=self.options.get(CONF_COMMAND_OUTBOX, DEFAULT_COMMAND_OUTBOX)
+            ): bool,
+            vol.Optional(
+                CONF_TRAFFIC_RECORDER,
+                default=self.options.get(CONF_TRAFFIC_RECORDER, DEFAULT_TRAFFIC_RECORDER)
+            ): bool,
         })
 
 
@@ -136,9 +184,8 @@ class BemfaSmartOptionsFlowHandler(config_entries.OptionsFlow):
         """选择要配置传感器的空调"""
         _LOGGER.debug("async_step_select_ac_for_sensor called with user_input: %s", user_input)
         air_conditioners = {
-            device['topic']: device['name']
-            for device in self.coordinator_data
-            if device.get('id') == "aircondition"
+            device.topic: device.name
+            for device in self.coordinator.get_devices_by_type(DEVICE_TYPE_AIR_CONDITIONER)
         }
 
         ac_options = [
@@ -213,9 +260,8 @@ class BemfaSmartOptionsFlowHandler(config_entries.OptionsFlow):
         """选择要配置挡位数的风扇"""
         _LOGGER.debug("async_step_select_fan_for_levels called with user_input: %s", user_input)
         fans = {
-            device['topic']: device['name']
-            for device in self.coordinator_data
-            if device.get('id') == DEVICE_TYPE_FAN
+            device.topic: device.name
+            for device in self.coordinator.get_devices_by_type(DEVICE_TYPE_FAN)
         }
 
         fan_options = [
@@ -281,4 +327,119 @@ class BemfaSmartOptionsFlowHandler(config_entries.OptionsFlow):
             data_schema=data_schema,
             errors=errors,
             description_placeholders={"fan_name": self.current_fan_name}
-        )
\ No newline at end of file
+        )
+
+    async def async_step_select_curtain_for_travel(self, user_input=None):
+        """选择要配置运行时间的窗帘"""
+        _LOGGER.debug("async_step_select_curtain_for_travel called with user_input: %s", user_input)
+        curtains = {
+            device.topic: device.name
+            for device in self.coordinator.get_devices_by_type(DEVICE_TYPE_CURTAIN)
+        }
+
+        curtain_options = [
+            {"value": "back", "label": "返回主菜单"}
+        ]
+        curtain_options.extend([
+            {"value": topic, "label": name} for topic, name in curtains.items()
+        ])
+        data_schema = vol.Schema({
+            vol.Required(CONF_CURTAIN_TOPIC_TO_CONFIGURE): selector.SelectSelector(
+                selector.SelectSelectorConfig(options=curtain_options, mode=selector.SelectSelectorMode.DROPDOWN)
+            )
+        })
+
+        if user_input is not None:
+            self.current_curtain_topic = user_input.get(CONF_CURTAIN_TOPIC_TO_CONFIGURE)
+            if self.current_curtain_topic == "back":
+                return await self.async_step_init()
+            elif self.current_curtain_topic:
+                self.current_curtain_name = curtains.get(self.current_curtain_topic, "未知窗帘")
+                return await self.async_step_set_curtain_travel_time()
+            else:
+                return self.async_show_form(
+                    step_id="select_curtain_for_travel",
+                    data_schema=data_schema,
+                    errors={"base": "invalid_selection"}
+                )
+
+        return self.async_show_form(step_id="select_curtain_for_travel", data_schema=data_schema)
+
+    async def async_step_set_curtain_travel_time(self, user_input=None):
+        """设置选定窗帘从全关到全开的时间，0 表示不估算位置"""
+        _LOGGER.debug("async_step_set_curtain_travel_time called for curtain topic: %s with user_input: %s", self.current_curtain_topic, user_input)
+        errors = {}
+
+        if user_input is not None:
+            travel_time = user_input.get(CONF_CURTAIN_TRAVEL_TIME)
+            if self.current_curtain_topic:
+                self.options.setdefault(CONF_CURTAIN_TRAVEL_TIMES, {})
+                self.options[CONF_CURTAIN_TRAVEL_TIMES][self.current_curtain_topic] = travel_time
+                _LOGGER.info("Set curtain %s travel time to %s", self.current_curtain_name, travel_time)
+                return await self.async_step_select_curtain_for_travel()
+            else:
+                errors["base"] = "no_curtain_selected"
+
+        current_travel_time = self.options.get(CONF_CURTAIN_TRAVEL_TIMES, {}).get(
+            self.current_curtain_topic, DEFAULT_CURTAIN_TRAVEL_TIME
+        )
+
+        data_schema = vol.Schema({
+            vol.Required(
+                CONF_CURTAIN_TRAVEL_TIME,
+                default=current_travel_time
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=300))
+        })
+
+        return self.async_show_form(
+            step_id="set_curtain_travel_time",
+            data_schema=data_schema,
+            errors=errors,
+            description_placeholders={"curtain_name": self.current_curtain_name}
+        )
+
+    async def async_step_stale_thresholds(self, user_input=None):
+        """设置各设备类型超过多久未更新视为离线，0 表示不判定"""
+        _LOGGER.debug("async_step_stale_thresholds called with user_input: %s", user_input)
+        current = {**DEFAULT_STALE_THRESHOLDS, **self.options.get(CONF_STALE_THRESHOLDS, {})}
+
+        if user_input is not None:
+            self.options[CONF_STALE_THRESHOLDS] = {
+                device_type: user_input.get(device_type, 0) for device_type in DEVICE_TYPE_PLATFORMS
+            }
+            _LOGGER.info("Set stale thresholds to %s", self.options[CONF_STALE_THRESHOLDS])
+            return await self.async_step_init()
+
+        return self.async_show_form(
+            step_id="stale_thresholds",
+            data_schema=vol.Schema({
+                vol.Required(
+                    device_type,
+                    default=current.get(device_type, 0)
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=86400))
+                for device_type in DEVICE_TYPE_PLATFORMS
+            })
+        )
+
+    async def async_step_dispatch_tiers(self, user_input=None):
+        """设置各设备类型的状态刷新间隔，0 表示每次轮询都刷新"""
+        _LOGGER.debug("async_step_dispatch_tiers called with user_input: %s", user_input)
+        current = self.options.get(CONF_DISPATCH_TIERS, {})
+
+        if user_input is not None:
+            self.options[CONF_DISPATCH_TIERS] = {
+                device_type: user_input.get(device_type, 0) for device_type in DEVICE_TYPE_PLATFORMS
+            }
+            _LOGGER.info("Set dispatch tiers to %s", self.options[CONF_DISPATCH_TIERS])
+            return await self.async_step_init()
+
+        return self.async_show_form(
+            step_id="dispatch_tiers",
+            data_schema=vol.Schema({
+                vol.Required(
+                    device_type,
+                    default=current.get(device_type, 0)
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=3600))
+                for device_type in DEVICE_TYPE_PLATFORMS
+            })
+        )
@@ -6,10 +6,36 @@ NAME = "巴法智能"
 
 CONF_USER = "user"
 CONF_SCAN_INTERVAL = "scan_interval"
+CONF_MAX_SCAN_INTERVAL = "max_scan_interval"
 CONF_FAN_SPEED_LEVELS = "fan_speed_levels" 
+CONF_PUSH_MODE = "push_mode"
+CONF_COMMAND_OUTBOX = "command_outbox"
+CONF_STALE_THRESHOLDS = "stale_thresholds"
+CONF_CURTAIN_TRAVEL_TIMES = "curtain_travel_times" # 窗帘topic -> 全程开合时间（秒）
+CONF_DISPATCH_TIERS = "dispatch_tiers" # 设备类型 -> 轮询结果分发给实体的最短间隔（秒）
+CONF_TRAFFIC_RECORDER = "traffic_recorder"
 
 DEFAULT_SCAN_INTERVAL = 30  # 30秒扫描一次
+DEFAULT_MAX_SCAN_INTERVAL = 120 # 空闲时自适应轮询退避的上限（秒）
 DEFAULT_FAN_SPEED_LEVELS = 3 # 默认风扇挡位为3 (低、中、高)
+DEFAULT_CURTAIN_TRAVEL_TIME = 0 # 默认不估算窗帘运行中的位置
+COVER_ESTIMATE_INTERVAL = 1 # 窗帘运行时刷新估算位置的间隔（秒）
+DEFAULT_PUSH_MODE = False
+DEFAULT_COMMAND_OUTBOX = False
+DEFAULT_TRAFFIC_RECORDER = False
+DEFAULT_RECONCILE_INTERVAL = 300 # 推送模式下HTTP对账轮询间隔（秒）
+
+# 自适应轮询
+ADAPTIVE_BOOST_INTERVAL = 3 # 发送命令后的快速轮询间隔（秒）
+ADAPTIVE_BOOST_POLLS = 2 # 发送命令后快速轮询的次数
+ADAPTIVE_BACKOFF_FACTOR = 1.5 # 空闲时每次轮询间隔的放大倍数
+
+# 设备快照缓存
+SNAPSHOT_STORAGE_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 60 # 快照延迟写入时间（秒）
+
+# 设备连续这么多次完整处理的轮询中都不存在时才从设备注册表移除，期间显示为不可用
+DEVICE_REMOVAL_POLLS = 3
 
 # 设备类型
 DEVICE_TYPE_LIGHT = "light"
@@ -20,6 +46,13 @@ DEVICE_TYPE_SENSOR = "sensor"
 DEVICE_TYPE_OUTLET = "outlet"
 DEVICE_TYPE_SWITCH = "switch"
 
+# 各设备类型的离线判定阈值（秒），0 表示不判定。
+# unix 字段是topic最后一次收到消息的时间，灯和开关等设备只在被控制时才更新，
+# 因此默认只对定期上报数据的传感器启用
+DEFAULT_STALE_THRESHOLDS = {
+    DEVICE_TYPE_SENSOR: 600,
+}
+
 # 设备状态字段
 ATTR_ON = "on"
 ATTR_TEMPERATURE = "t"
@@ -30,4 +63,52 @@ ATTR_LAST_UPDATED = "unix"
 # API相关
 API_BASE_URL = "https://pro.bemfa.com/v4/app/v1"
 API_HOME_ROOM = f"{API_BASE_URL}/homeRoom"
-API_POST_MSG = "https://pro.bemfa.com/vv/postmsg2"
\ No newline at end of file
+API_POST_MSG = "https://pro.bemfa.com/vv/postmsg2"
+API_CONNECT_TIMEOUT = 5 # 建立连接超时（秒）
+API_READ_TIMEOUT = 10 # 读取响应超时（秒）
+API_TOTAL_TIMEOUT = 15 # 单次请求总超时（秒）
+API_MAX_CONNECTIONS = 4 # 单个账号同时进行的请求上限
+HOME_ROOM_CACHE_TTL = 2 # homeRoom结果的复用时间（秒），期间的刷新请求直接使用上一次结果
+
+# 多账号调度中心，所有账号共用的请求预算
+DATA_HUB = f"{DOMAIN}_hub" # hass.data 中调度中心的键
+HUB_MAX_CONNECTIONS = 8 # 所有账号同时进行的请求上限
+HUB_REQUEST_RATE = 20 # 所有账号合计每秒最多发起的请求数
+COMMAND_DEBOUNCE_WINDOW = 0.3 # 滑块类命令的合并窗口（秒）
+COMMAND_RATE_LIMIT = 10 # 每秒最多发送的命令数
+DEFAULT_BATCH_CONCURRENCY = 4 # 批量命令的默认并发数
+
+# 命令优先级，数值越小越先发送
+COMMAND_PRIORITY_HIGH = 0 # 停止和关闭
+COMMAND_PRIORITY_NORMAL = 1 # 实体的普通操作
+COMMAND_PRIORITY_LOW = 2 # 批量命令和待发队列重发
+COMMAND_PRIORITY_NAMES = {
+    COMMAND_PRIORITY_HIGH: "high",
+    COMMAND_PRIORITY_NORMAL: "normal",
+    COMMAND_PRIORITY_LOW: "low",
+}
+
+# 重试与熔断
+RETRY_ATTEMPTS = 3 # 单次请求的最大尝试次数
+RETRY_BASE_DELAY = 1 # 第一次重试前的退避上限（秒）
+RETRY_MAX_DELAY = 8 # 重试退避的最大值（秒）
+BREAKER_FAILURE_THRESHOLD = 5 # 连续失败多少次后熔断
+BREAKER_RESET_TIMEOUT = 60 # 熔断后多久放行探测请求（秒）
+
+# 待发命令队列
+OUTBOX_STORAGE_VERSION = 1
+OUTBOX_SAVE_DELAY = 1 # 队列变化后延迟写入存储的时间（秒）
+DEFAULT_OUTBOX_TTL = 600 # 命令在队列中的有效期（秒），过期后不再重发
+
+# 流量录制，用于离线回放复现现场的性能问题
+RECORDER_FORMAT_VERSION = 1
+RECORDER_FLUSH_DELAY = 5 # 录制记录延迟批量写入文件的时间（秒）
+RECORDER_MAX_BYTES = 10 * 1024 * 1024 # 录制文件的大小上限，达到后停止录制
+
+# 推送通道(TCP)相关
+PUSH_HOST = "bemfa.com"
+PUSH_PORT = 8344
+PUSH_HEARTBEAT_INTERVAL = 30 # 心跳间隔（秒），服务器要求60秒内有数据
+PUSH_READ_TIMEOUT = 90 # 超过该时间未收到任何数据则重连
+PUSH_RECONNECT_MIN = 5
+PUSH_RECONNECT_MAX = 300
\ No newline at end of file
@@ -1,19 +1,53 @@
 """巴法智能集成的数据协调器"""
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util.json import json_loads
 import asyncio
+import contextlib
 import aiohttp
+import hashlib
+import heapq
+import itertools
 import logging
+import time
 from datetime import timedelta
 
 from .const import (
     DOMAIN, API_BASE_URL, API_HOME_ROOM, API_POST_MSG,
-    CONF_USER, DEFAULT_SCAN_INTERVAL
+    CONF_USER, DEFAULT_SCAN_INTERVAL, DEFAULT_RECONCILE_INTERVAL,
+    API_CONNECT_TIMEOUT, API_READ_TIMEOUT, API_TOTAL_TIMEOUT, API_MAX_CONNECTIONS, HOME_ROOM_CACHE_TTL,
+    COMMAND_DEBOUNCE_WINDOW, COMMAND_RATE_LIMIT, DEFAULT_BATCH_CONCURRENCY,
+    COMMAND_PRIORITY_HIGH, COMMAND_PRIORITY_NORMAL, COMMAND_PRIORITY_LOW, COMMAND_PRIORITY_NAMES,
+    DEFAULT_MAX_SCAN_INTERVAL, ADAPTIVE_BOOST_INTERVAL, ADAPTIVE_BOOST_POLLS,
+    ADAPTIVE_BACKOFF_FACTOR, SNAPSHOT_STORAGE_VERSION, SNAPSHOT_SAVE_DELAY,
+    DEFAULT_STALE_THRESHOLDS, DEVICE_REMOVAL_POLLS
 )
+from .metrics import BemfaMetrics
+from .models import parse_device
+from .outbox import CommandOutbox
+from .push import BemfaPushClient, parse_push_msg
+from .recorder import TrafficRecorder
+from .resilience import CircuitBreaker, REQUEST_PROBE, async_retry, is_connect_error
 
 _LOGGER = logging.getLogger(__name__)
 
+def command_priority(msg: str, default: int = COMMAND_PRIORITY_NORMAL) -> int:
+    """交互发出的关闭和停止命令使用最高优先级，批量和重发的低优先级命令保持不变"""
+    if default != COMMAND_PRIORITY_NORMAL:
+        return default
+    if msg == "pause" or msg.split("#", 1)[0] == "off":
+        return COMMAND_PRIORITY_HIGH
+    return default
+
+
+def snapshot_storage_key(entry_id: str) -> str:
+    """返回配置项对应的快照存储键"""
+    return f"{DOMAIN}.{entry_id}.snapshot"
+
 
 class BemfaSmartCoordinator(DataUpdateCoordinator):
     """负责从巴法智能API获取数据的协调器"""
@@ -22,72 +56,1109 @@ class BemfaSmartCoordinator(DataUpdateCoordinator):
         self,
         hass: HomeAssistant,
         user: str,
-        scan_interval: int = DEFAULT_SCAN_INTERVAL
+        scan_interval: int = DEFAULT_SCAN_INTERVAL,
+        max_scan_interval: int = DEFAULT_MAX_SCAN_INTERVAL,
+        entry_id: str | None = None,
+        stale_thresholds: dict | None = None,
+        dispatch_tiers: dict | None = None,
+        hub=None
     ):
         """初始化协调器"""
         self.user = user
-        self.session = aiohttp.ClientSession()
+        # 接口地址，基准测试和回放时可指向本地模拟服务器
+        self.home_room_url = API_HOME_ROOM
+        self.post_msg_url = API_POST_MSG
+        # 多账号时由调度中心统一分配并发和请求速率
+        self.hub = hub
+        # 使用Home Assistant共享的会话，连接池和DNS缓存由其统一管理
+        self.session = hub.session if hub is not None else async_get_clientsession(hass)
+        self._timeout = aiohttp.ClientTimeout(
+            total=API_TOTAL_TIMEOUT,
+            connect=API_CONNECT_TIMEOUT,
+            sock_read=API_READ_TIMEOUT,
+        )
+        # 限制单个账号同时占用的连接数
+        self._request_semaphore = asyncio.Semaphore(API_MAX_CONNECTIONS)
         update_interval = timedelta(seconds=scan_interval)
-        _LOGGER.debug("BemfaSmartCoordinator initializing with scan_interval: %d seconds", scan_interval)
+        _LOGGER.debug("BemfaSmartCoordinator initializing with scan_interval: %d seconds, max: %d seconds",
+                      scan_interval, max_scan_interval)
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
             update_interval=update_interval,
+            always_update=False,
+        )
+        self._topic_entities = {} # topic -> 该topic下的实体集合，用于在实体间共享乐观状态
+        self._devices_by_topic = {} # topic -> 设备状态
+        self._topics_by_type = {} # 设备类型 -> topic列表
+        self.changed_topics = set() # 最近一次更新中数据发生变化的topic
+        self._topic_listeners = {} # topic -> 订阅该topic的回调列表
+        self._device_listeners = [] # 设备增加或消失时的回调列表
+        self._remove_dispatch_listener = None
+        self._last_dispatch_available = True
+        self._last_digest = None # 上一次成功获取的响应体摘要
+        self._dirty_topics = {} # topic -> 本地乐观更新的时间（loop时间），下一次轮询必须重新分发
+        self.polls_processed = 0 # 完整解析处理的轮询次数
+        self.polls_skipped = 0 # 因响应未变化而跳过处理的轮询次数
+        # homeRoom请求合并：同一时间只有一个请求，刚完成的结果在短时间内直接复用
+        self._fetch_task = None
+        self._last_fetch_at = None # 上一次成功获取的时间（loop时间）
+        self._fetch_started_at = None # 当前homeRoom请求发出的时间（loop时间）
+        self.fetches_coalesced = 0 # 加入进行中请求的刷新次数
+        self.fetches_cached = 0 # 直接复用最近结果的刷新次数
+        # 自适应轮询：有活动时使用scan_interval，空闲时逐步退避到max_scan_interval
+        self._base_interval = scan_interval
+        self._max_interval = max(scan_interval, max_scan_interval)
+        self._current_interval = scan_interval
+        self._boost_polls_remaining = 0 # 发送命令后仍需快速轮询的次数
+        self._positions = {} # topic -> 在 self.data 中的下标
+        self.push_client = None
+        self.loaded_platforms = [] # 已为本配置项加载的平台
+        self._pending_commands = {} # topic -> 等待合并发送的命令
+        self._flush_tasks = set() # 等待合并窗口结束的发送任务
+        self.commands_sent = 0 # 实际发送的命令数
+        self.commands_coalesced = 0 # 被后续命令取代而未发送的命令数
+        # 限速队列：按 (优先级, 入队顺序) 排列的等待发送的命令
+        self._command_queue = []
+        self._command_seq = itertools.count()
+        self._command_pump = None # 等待下一个发送时机的定时器
+        self._next_command_slot = 0.0 # 下一条命令最早可发送的时间（loop时间）
+        self._latest_command = {} # topic -> 最近一次发送请求的序号，用于判断失败的命令是否仍是最新意图
+        # 低优先级命令最多占用的连接数，始终为高优先级命令保留一个连接
+        self._low_priority_semaphore = asyncio.Semaphore(max(1, API_MAX_CONNECTIONS - 1))
+        # 持久化最近一次成功获取的设备快照，用于快速启动
+        self._snapshot_store = (
+            Store(hass, SNAPSHOT_STORAGE_VERSION, snapshot_storage_key(entry_id))
+            if entry_id is not None else None
+        )
+        self._snapshot_save_pending = False # 已安排写入、尚未写入的快照
+        self.snapshot_stale = False # 当前数据是否来自缓存快照、尚未被实时轮询确认
+        self.metrics = BemfaMetrics()
+        # 离线判定：按过期时间排序的堆 (过期时间, topic, unix)，只为最早过期的设备设置一个定时器
+        self._stale_thresholds = {**DEFAULT_STALE_THRESHOLDS, **(stale_thresholds or {})}
+        self._stale_heap = []
+        self._stale_topics = set() # 已超过阈值未更新的topic
+        self._missing_polls = {} # topic -> 连续未出现在轮询结果中的次数，达到阈值后才移除
+        self._unsub_stale_timer = None
+        self._stale_timer_at = None
+        # 分发分级：按设备类型限制轮询结果分发给实体的频率，未到时间的变化暂存
+        self._dispatch_tiers = {
+            device_type: seconds for device_type, seconds in (dispatch_tiers or {}).items() if seconds
+        }
+        self._held_topics = {} # 设备类型 -> 暂存未分发的topic集合
+        self._tier_due = {} # 设备类型 -> 下一次允许分发的时间（loop时间）
+        self._tier_bypass = set() # 刚被控制的topic，下一次轮询的变化立即分发
+        self._tier_timer = None
+        self.dispatches_deferred = 0 # 因分发分级被推迟的topic变化次数
+        self._metrics_listeners = [] # 每次请求后都需要通知的统计监听器
+        # homeRoom和postmsg共用一个熔断器，任一接口连续失败都会暂停全部请求
+        self.breaker = CircuitBreaker(on_state_change=self._async_breaker_changed)
+        self._entry_id = entry_id
+        self.outbox = None # 启用后保存发送失败的命令，连接恢复时重发
+        self.recorder = None # 启用后录制homeRoom响应和命令，用于离线回放
+        self._outbox_task = None
+
+
+    @callback
+    def async_register_topic_entity(self, topic: str, entity):
+        """登记topic下的实体，返回的回调在实体移除时注销"""
+        entities = self._topic_entities.setdefault(topic, set())
+        entities.add(entity)
+
+        @callback
+        def remove_entity():
+            entities.discard(entity)
+            if not entities and self._topic_entities.get(topic) is entities:
+                del self._topic_entities[topic]
+
+        return remove_entity
+
+    @callback
+    def async_share_state(self, source, device_state):
+        """把实体的乐观状态同步给同一topic下的其他实体，不发起请求"""
+        for entity in tuple(self._topic_entities.get(device_state.topic, ())):
+            if entity is not source:
+                entity.async_apply_shared_state(device_state)
+
+    def get_device(self, topic: str):
+        """根据topic获取设备数据，不存在时返回None"""
+        return self._devices_by_topic.get(topic)
+
+    def get_topics_by_type(self, device_type: str):
+        """获取指定设备类型的全部topic"""
+        return self._topics_by_type.get(device_type, [])
+
+    @property
+    def device_types(self):
+        """当前账号中存在的设备类型"""
+        return [device_type for device_type, topics in self._topics_by_type.items() if topics]
+
+    def get_devices_by_type(self, device_type: str):
+        """获取指定设备类型的全部设备数据"""
+        return [self._devices_by_topic[topic] for topic in self.get_topics_by_type(device_type)]
+
+    @callback
+    def async_add_topic_listener(self, topic: str, update_callback):
+        """按topic订阅设备更新，只有该topic的数据变化时才会回调"""
+        self._topic_listeners.setdefault(topic, []).append(update_callback)
+        if self._remove_dispatch_listener is None:
+            # 协调器只保留一个全局监听器，由它按变更集分发给各topic
+            self._remove_dispatch_listener = self.async_add_listener(self._async_dispatch_changes)
+
+        @callback
+        def remove_listener():
+            listeners = self._topic_listeners.get(topic)
+            if listeners and update_callback in listeners:
+                listeners.remove(update_callback)
+                if not listeners:
+                    del self._topic_listeners[topic]
+            if not self._topic_listeners and self._remove_dispatch_listener is not None:
+                self._remove_dispatch_listener()
+                self._remove_dispatch_listener = None
+
+        return remove_listener
+
+    @property
+    def api_available(self):
+        """巴法API是否可用：最近一次轮询成功且熔断器未打开"""
+        return self.last_update_success and not self.breaker.is_open
+
+    @callback
+    def _async_breaker_changed(self, state):
+        """熔断器状态变化时刷新所有实体的available"""
+        self._async_dispatch_changes()
+        self._async_notify_metrics()
+        if not self.breaker.is_open:
+            self._async_schedule_outbox_drain()
+
+    @callback
+    def _async_dispatch_changes(self):
+        """将变更集分发给订阅了对应topic的实体"""
+        available = self.api_available
+        if available != self._last_dispatch_available:
+            # API可用性发生变化时，所有实体都需要刷新available
+            self._last_dispatch_available = available
+            topics = list(self._topic_listeners)
+        elif not available:
+            return
+        else:
+            topics = [topic for topic in self.changed_topics if topic in self._topic_listeners]
+
+        _LOGGER.debug("分发设备更新，变化topic数: %d", len(topics))
+        self.changed_topics = set()
+        start = time.perf_counter()
+        for topic in topics:
+            for update_callback in list(self._topic_listeners.get(topic, [])):
+                update_callback()
+        self.metrics.record_dispatch(time.perf_counter() - start)
+
+    @callback
+    def _async_apply_dispatch_tiers(self, changed):
+        """按设备类型的分发间隔过滤轮询发现的变化，返回 (需要立即分发的topic, 其中到期释放的暂存topic)"""
+        if not self._dispatch_tiers:
+            return changed, set()
+        now = self.hass.loop.time()
+        dispatch = set()
+        for topic in changed:
+            device = self._devices_by_topic.get(topic)
+            if (device is None or topic in self._tier_bypass
+                    or device.device_type not in self._dispatch_tiers):
+                self._tier_bypass.discard(topic)
+                dispatch.add(topic)
+                continue
+            self._held_topics.setdefault(device.device_type, set()).add(topic)
+            if now < self._tier_due.get(device.device_type, 0):
+                self.dispatches_deferred += 1
+        if not self._boost_polls_remaining:
+            # 命令后的快速轮询已结束，不再为之前控制过的topic放行
+            self._tier_bypass.clear()
+        released = self._release_due_tiers(now)
+        self._async_schedule_tier_timer(now)
+        return dispatch | released, released
+
+    def _release_due_tiers(self, now):
+        """取出已到分发时间的暂存topic，并记录各类型下一次允许分发的时间"""
+        released = set()
+        for device_type in list(self._held_topics):
+            if now < self._tier_due.get(device_type, 0):
+                continue
+            released |= self._held_topics.pop(device_type)
+            self._tier_due[device_type] = now + self._dispatch_tiers[device_type]
+        return released
+
+    @callback
+    def _async_schedule_tier_timer(self, now):
+        """为最早到期的暂存类型安排一次分发"""
+        if self._tier_timer is not None:
+            self._tier_timer.cancel()
+            self._tier_timer = None
+        if not self._held_topics:
+            return
+        due = min(self._tier_due.get(device_type, now) for device_type in self._held_topics)
+        self._tier_timer = self.hass.loop.call_at(max(due, now), self._async_tier_timer_fired)
+
+    @callback
+    def _async_tier_timer_fired(self):
+        """分发到期的暂存变化，轮询结果未变化时也能按时送达"""
+        self._tier_timer = None
+        now = self.hass.loop.time()
+        released = self._release_due_tiers(now)
+        if released:
+            self.changed_topics |= released
+            self._async_dispatch_changes()
+        self._async_schedule_tier_timer(now)
+
+    def is_stale(self, topic: str) -> bool:
+        """设备是否已超过离线阈值未更新，或已从轮询结果中消失等待移除"""
+        return topic in self._stale_topics or topic in self._missing_polls
+
+    @property
+    def stale_count(self):
+        """当前判定为离线的设备数"""
+        return len(self._stale_topics)
+
+    @callback
+    def _async_track_staleness(self, devices):
+        """更新设备的过期时间，并为最早过期的设备安排定时器"""
+        now = time.time()
+        for device in devices:
+            threshold = self._stale_thresholds.get(device.device_type, 0)
+            if not threshold or not device.unix:
+                expires = None
+            else:
+                expires = device.unix + threshold
+            stale = expires is not None and expires <= now
+            if stale != (device.topic in self._stale_topics):
+                # 离线状态发生变化，实体需要刷新available
+                if stale:
+                    self._stale_topics.add(device.topic)
+                else:
+                    self._stale_topics.discard(device.topic)
+                self.changed_topics.add(device.topic)
+            if expires is not None and not stale:
+                heapq.heappush(self._stale_heap, (expires, device.topic, device.unix))
+
+        if len(self._stale_heap) > 2 * len(self._devices_by_topic) + 16:
+            # 失效条目过多时按当前设备重建堆
+            self._stale_heap = [
+                entry for entry in self._stale_heap if self._is_current_stale_entry(entry)
+            ]
+            heapq.heapify(self._stale_heap)
+        self._async_schedule_stale_timer()
+
+    def _is_current_stale_entry(self, entry):
+        """堆中的条目是否仍对应设备当前的unix"""
+        _, topic, unix = entry
+        device = self._devices_by_topic.get(topic)
+        return device is not None and device.unix == unix and topic not in self._stale_topics
+
+    @callback
+    def _async_schedule_stale_timer(self):
+        """为堆顶的过期时间设置定时器，已设置相同时间时不重复设置"""
+        while self._stale_heap and not self._is_current_stale_entry(self._stale_heap[0]):
+            heapq.heappop(self._stale_heap)
+        next_expiry = self._stale_heap[0][0] if self._stale_heap else None
+        if next_expiry == self._stale_timer_at:
+            return
+        self._async_cancel_stale_timer()
+        if next_expiry is None:
+            return
+        self._stale_timer_at = next_expiry
+        self._unsub_stale_timer = async_call_later(
+            self.hass, max(0, next_expiry - time.time()), self._async_stale_timer_fired
+        )
+
+    @callback
+    def _async_cancel_stale_timer(self):
+        """取消离线判定定时器"""
+        if self._unsub_stale_timer is not None:
+            self._unsub_stale_timer()
+            self._unsub_stale_timer = None
+        self._stale_timer_at = None
+
+    @callback
+    def _async_stale_timer_fired(self, _now):
+        """定时器到期，把已过期的设备标记为离线并通知对应实体"""
+        self._unsub_stale_timer = None
+        self._stale_timer_at = None
+        now = time.time()
+        expired = []
+        while self._stale_heap and self._stale_heap[0][0] <= now:
+            entry = heapq.heappop(self._stale_heap)
+            if self._is_current_stale_entry(entry):
+                self._stale_topics.add(entry[1])
+                expired.append(entry[1])
+        if expired:
+            _LOGGER.debug("%d 个设备超过离线阈值未更新: %s", len(expired), expired)
+            self.changed_topics.update(expired)
+            self._async_dispatch_changes()
+        self._async_schedule_stale_timer()
+
+    @callback
+    def async_add_device_listener(self, update_callback):
+        """订阅设备增减，回调参数为 (新增topic集合, 消失topic集合)"""
+        self._device_listeners.append(update_callback)
+
+        @callback
+        def remove_listener():
+            if update_callback in self._device_listeners:
+                self._device_listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def _async_notify_device_changes(self, added, removed):
+        """通知设备增减，并同步推送通道的订阅列表"""
+        _LOGGER.info("巴法账号设备变化：新增 %d 个，消失 %d 个", len(added), len(removed))
+        for update_callback in list(self._device_listeners):
+            update_callback(added, removed)
+        if self.push_client is not None:
+            self.hass.async_create_task(
+                self.push_client.async_set_topics(list(self._devices_by_topic))
+            )
+
+    @callback
+    def async_add_metrics_listener(self, update_callback):
+        """订阅统计数据更新，每次请求完成后都会回调"""
+        self._metrics_listeners.append(update_callback)
+
+        @callback
+        def remove_listener():
+            if update_callback in self._metrics_listeners:
+                self._metrics_listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def _async_notify_metrics(self):
+        """通知统计监听器"""
+        for update_callback in list(self._metrics_listeners):
+            update_callback()
+
+    @property
+    def poll_stats(self):
+        """返回轮询处理与跳过的计数"""
+        return {
+            "processed": self.polls_processed,
+            "skipped": self.polls_skipped,
+            "coalesced": self.fetches_coalesced,
+            "cached": self.fetches_cached,
+            "deferred": self.dispatches_deferred,
+            "held": sum(len(topics) for topics in self._held_topics.values()),
+        }
+
+    def _parse_devices(self, raw_devices):
+        """把设备字典解析为状态列表，丢弃缺少topic和重复的设备"""
+        devices = []
+        seen = set()
+        for raw in raw_devices:
+            if not isinstance(raw, dict):
+                continue
+            topic = raw.get("topic")
+            if topic is None or topic in seen:
+                continue
+            seen.add(topic)
+            previous = self._devices_by_topic.get(topic)
+            if previous is not None and previous.matches_raw(raw):
+                # 状态未变化时直接沿用旧对象，不创建新对象，变化检测只需比较引用
+                devices.append(previous)
+            else:
+                devices.append(parse_device(raw))
+        return devices
+
+    @callback
+    def _async_mark_dirty(self, topic: str):
+        """实体已在本地乐观更新，下一次轮询无论云端数据是否变化都重新分发该topic"""
+        self._dirty_topics[topic] = self.hass.loop.time()
+        self._last_digest = None
+
+    def _take_dirty_topics(self):
+        """取出在本次请求发出前被本地修改过的topic，之后修改的留给下一次轮询"""
+        started = self._fetch_started_at
+        dirty = {
+            topic for topic, marked_at in self._dirty_topics.items()
+            if started is None or marked_at <= started
+        }
+        for topic in dirty:
+            del self._dirty_topics[topic]
+        return dirty
+
+    def _retain_missing_devices(self, devices):
+        """保留本次轮询中消失但未达到移除阈值的设备，返回 (设备列表, 可用性变化的topic)"""
+        seen = {device.topic for device in devices}
+        toggled = {topic for topic in self._missing_polls if topic in seen}
+        for topic in toggled:
+            # 设备重新出现，恢复可用
+            del self._missing_polls[topic]
+        if not devices:
+            # 接口偶尔返回空列表，此时不计数也不移除已有设备
+            if self._devices_by_topic:
+                _LOGGER.warning("API返回的设备列表为空，暂不移除已有设备")
+            return list(self._devices_by_topic.values()), toggled
+        retained = []
+        for topic, device in self._devices_by_topic.items():
+            if topic in seen:
+                continue
+            polls = self._missing_polls.get(topic, 0) + 1
+            if polls >= DEVICE_REMOVAL_POLLS:
+                del self._missing_polls[topic]
+                continue
+            if polls == 1:
+                toggled.add(topic)
+            self._missing_polls[topic] = polls
+            retained.append(device)
+        if retained:
+            _LOGGER.debug("%d 个设备本次轮询未返回，暂时标记为不可用", len(retained))
+        return devices + retained, toggled
+
+    def _diff_snapshot(self, devices):
+        """与上一次的数据逐topic比较，返回发生变化的topic集合"""
+        changed = {
+            device.topic for device in devices
+            if self._devices_by_topic.get(device.topic) is not device
+        }
+        # 已消失的topic也视为发生变化
+        seen = {device.topic for device in devices}
+        changed.update(topic for topic in self._devices_by_topic if topic not in seen)
+        return changed
+
+    def _rebuild_index(self, devices):
+        """根据最新的设备状态列表重建topic索引和类型索引"""
+        devices_by_topic = {}
+        topics_by_type = {}
+        positions = {}
+        for position, device in enumerate(devices):
+            devices_by_topic[device.topic] = device
+            positions[device.topic] = position
+            topics_by_type.setdefault(device.device_type, []).append(device.topic)
+        self._devices_by_topic = devices_by_topic
+        self._topics_by_type = topics_by_type
+        self._positions = positions
+
+    async def async_load_snapshot(self) -> bool:
+        """从存储中加载上一次的设备快照，成功时返回True"""
+        if self._snapshot_store is None:
+            return False
+        stored = await self._snapshot_store.async_load()
+        if not stored or not isinstance(stored.get("devices"), list):
+            return False
+        devices = self._parse_devices(stored["devices"])
+        self._rebuild_index(devices)
+        self.data = devices
+        self._async_track_staleness(devices)
+        self.snapshot_stale = True
+        _LOGGER.debug("已从缓存快照加载 %d 个设备，等待实时轮询确认", len(devices))
+        return True
+
+    @callback
+    def _async_schedule_snapshot_save(self):
+        """延迟保存当前快照，每个保存间隔内最多写一次"""
+        if self._snapshot_store is None or self._snapshot_save_pending:
+            # async_delay_save 每次调用都会推迟写入时间，持续变化时会一直不写，因此已安排时不再调用
+            return
+        self._snapshot_save_pending = True
+
+        def snapshot_data():
+            # 保存时才读取 self.data，此时协调器已写入最新数据
+            self._snapshot_save_pending = False
+            return {"devices": [device.as_raw() for device in self.data]}
+
+        self._snapshot_store.async_delay_save(snapshot_data, SNAPSHOT_SAVE_DELAY)
+
+    async def async_start_push(self, host=None, port=None):
+        """启动TCP推送通道，连接成功后HTTP轮询降级为慢速对账"""
+        if self.push_client is not None:
+            return
+        kwargs = {}
+        if host is not None:
+            kwargs["host"] = host
+        if port is not None:
+            kwargs["port"] = port
+        self.push_client = BemfaPushClient(
+            self.hass,
+            self.user,
+            list(self._devices_by_topic),
+            self.async_handle_push_message,
+            self._async_push_connection_changed,
+            **kwargs
         )
-        self.climate_entities = [] # 确保这一行存在并正确初始化
+        self.push_client.async_start()
+
+    async def async_stop_push(self):
+        """停止推送通道并恢复正常轮询间隔"""
+        if self.push_client is None:
+            return
+        await self.push_client.async_stop()
+        self.push_client = None
+        self._current_interval = self._base_interval
+        self._apply_update_interval()
 
+    @callback
+    def _async_push_connection_changed(self, connected):
+        """推送通道连接状态变化时调整轮询间隔"""
+        if not connected:
+            self._current_interval = self._base_interval
+        self._apply_update_interval()
+        if not connected and self._listeners:
+            # 已按对账间隔安排的下一次轮询可能要等几分钟，立即按正常间隔重新安排
+            self._schedule_refresh()
+        _LOGGER.debug("推送通道%s，轮询间隔调整为 %s", "已连接" if connected else "已断开", self.update_interval)
 
-    def get_climate_entities_for_topic(self, topic: str):
-        """根据topic获取相关的气候实体"""
-        return [entity for entity in self.climate_entities if entity.device_data['topic'] == topic]
+    @property
+    def push_connected(self):
+        """推送通道是否已连接"""
+        return self.push_client is not None and self.push_client.connected
+
+    def _apply_update_interval(self):
+        """根据当前轮询状态设置协调器的更新间隔"""
+        seconds = self._current_interval
+        if self.push_connected:
+            # 推送通道可用时HTTP轮询只用于对账
+            seconds = max(seconds, DEFAULT_RECONCILE_INTERVAL)
+        elif self.hub is not None and seconds >= self._base_interval:
+            # 退避会改变轮询相位，每次都重新对齐到其他账号轮询之间的空档；命令后的快速轮询不受影响
+            delay = self.hub.async_poll_delay(self._hub_account, seconds, minimum=seconds / 2)
+            if delay is not None:
+                seconds = delay
+        self.update_interval = timedelta(seconds=seconds)
+
+    def _adapt_interval(self, changed: bool):
+        """根据本次轮询是否发现变化调整下一次的轮询间隔"""
+        if self._boost_polls_remaining > 0:
+            self._boost_polls_remaining -= 1
+            self._current_interval = min(ADAPTIVE_BOOST_INTERVAL, self._base_interval)
+        elif changed:
+            self._current_interval = self._base_interval
+        else:
+            self._current_interval = min(
+                self._current_interval * ADAPTIVE_BACKOFF_FACTOR, self._max_interval
+            )
+        self._apply_update_interval()
+
+    @callback
+    def _async_boost_polling(self):
+        """发送命令后缩短轮询间隔，尽快确认设备状态"""
+        if self.push_connected:
+            return
+        self._boost_polls_remaining = ADAPTIVE_BOOST_POLLS
+        interval = min(ADAPTIVE_BOOST_INTERVAL, self._base_interval)
+        if interval >= self._current_interval:
+            return
+        self._current_interval = interval
+        self._apply_update_interval()
+        if self._listeners:
+            # 立即按新的间隔重新安排下一次轮询
+            self._schedule_refresh()
+
+    @callback
+    def async_handle_push_message(self, topic: str, msg: str):
+        """处理推送通道收到的消息，直接更新对应设备并分发"""
+        device = self._devices_by_topic.get(topic)
+        if device is None:
+            _LOGGER.debug("收到未知topic的推送: %s", topic)
+            return
+        current_msg = device.msg()
+        new_msg = parse_push_msg(device.device_type, msg, current_msg)
+        if new_msg is None:
+            _LOGGER.debug("无法解析topic %s 的推送消息: %s", topic, msg)
+            return
+        if new_msg == current_msg:
+            return
+
+        updated = parse_device({**device.as_raw(), 'msg': new_msg, 'unix': int(time.time())})
+        self._devices_by_topic[topic] = updated
+        self._async_track_staleness([updated])
+        position = self._positions.get(topic)
+        if self.data is not None and position is not None:
+            self.data[position] = updated
+        # 推送改变了本地状态，下一次对账轮询必须完整处理响应
+        self._last_digest = None
+        self.changed_topics.add(topic)
+        self._async_dispatch_changes()
+        self._async_schedule_snapshot_save()
 
 
     async def _async_update_data(self):
-        """从API获取最新数据"""
+        """获取最新数据，并发的刷新共享同一次请求，刚获取的结果直接复用"""
+        # 定时轮询、选项流程、update_entity服务等都会触发刷新，这里统一合并
+        task = self._fetch_task
+        if task is not None and not task.done():
+            self.fetches_coalesced += 1
+            _LOGGER.debug("homeRoom请求进行中，等待其结果 (已合并 %d 次)", self.fetches_coalesced)
+            return await asyncio.shield(task)
+        # 复用时间不超过轮询间隔的一半，避免吞掉定时轮询
+        ttl = min(HOME_ROOM_CACHE_TTL, self._current_interval / 2)
+        if (self.data is not None and self._last_fetch_at is not None
+                and self.hass.loop.time() - self._last_fetch_at < ttl):
+            self.fetches_cached += 1
+            return self.data
+        self._fetch_task = task = self.hass.async_create_task(
+            self._async_fetch_and_record(), f"{DOMAIN}_home_room_fetch"
+        )
+        return await asyncio.shield(task)
+
+    async def _async_fetch_and_record(self):
+        """从API获取最新数据并记录请求统计"""
+        admission = self.breaker.allow_request()
+        if not admission:
+            # 熔断中没有发出请求，单独计数，不计入失败次数和延迟
+            self.metrics.record_fetch_short_circuit()
+            self._async_notify_metrics()
+            _LOGGER.debug("巴法API熔断中，跳过本次轮询")
+            raise UpdateFailed("巴法API熔断中，暂停请求")
+        if self.hub is not None:
+            self.hub.async_record_poll(self._hub_account)
+        self._fetch_started_at = self.hass.loop.time()
+        start = time.perf_counter()
+        success = False
+        try:
+            result = await self._async_fetch_home_room(admission)
+            success = True
+            self._last_fetch_at = self.hass.loop.time()
+            return result
+        finally:
+            self.metrics.record_fetch(time.perf_counter() - start, success)
+            self._async_notify_metrics()
+            if success:
+                self._async_schedule_outbox_drain()
+
+    async def _async_fetch_home_room(self, admission):
+        """请求homeRoom接口并处理返回的设备列表，admission 为熔断器放行的结果"""
         _LOGGER.debug("BemfaSmartCoordinator fetching new data from API.")
         try:
-            url = f"{API_HOME_ROOM}?user={self.user}"
-            async with self.session.get(url) as response:
-                _LOGGER.debug("API request URL: %s, Status: %d", url, response.status)
-                if response.status != 200:
-                    response.raise_for_status()
-                data = await response.json()
-                if data.get("code") != 0:
-                    _LOGGER.error("API返回错误: %s", data.get('msg'))
-                    raise UpdateFailed(f"API返回错误: {data.get('msg')}")
-                _LOGGER.debug("API数据获取成功，共 %d 个设备", len(data.get("data", [])))
-                return data.get("data", [])
+            # homeRoom是幂等请求，网络错误和5xx时退避重试
+            body = await async_retry(self._async_get_home_room_body)
+        except asyncio.CancelledError:
+            # 轮询被取消时没有结果，不能一直占用半开探测名额
+            if admission == REQUEST_PROBE:
+                self.breaker.release_probe()
+            raise
+        except asyncio.TimeoutError as e:
+            self.breaker.record_failure()
+            _LOGGER.error("API请求超时")
+            raise UpdateFailed("API请求超时") from e
         except aiohttp.ClientError as e:
+            self.breaker.record_failure()
             _LOGGER.error("API请求失败: %s", str(e))
             raise UpdateFailed(f"API请求失败: {str(e)}") from e
         except Exception as e:
+            self.breaker.record_failure()
             _LOGGER.error("获取数据失败: %s", str(e))
             raise UpdateFailed(f"获取数据失败: {str(e)}") from e
+        self.breaker.record_success()
 
-    async def async_send_command(self, topic: str, msg: str, device_type: int = 3):
-        """向设备发送控制命令"""
         try:
-            url = f"{API_POST_MSG}"
-            payload = f"user={self.user}&topic={topic}&msg={msg}&type={device_type}"
-            headers = {
-                "Content-Type": "application/x-www-form-urlencoded;charset=utf-8",
-                "User-Agent": "Dart/3.7 (dart:io)"
-            }
-            _LOGGER.debug("Sending command to topic: %s with msg: %s", topic, msg)
-            async with self.session.post(url, data=payload, headers=headers) as response:
-                if response.status != 200:
-                    _LOGGER.error("发送命令失败，状态码: %d", response.status)
+            return self._process_home_room(body)
+        except UpdateFailed:
+            raise
+        except Exception as e:
+            _LOGGER.error("处理数据失败: %s", str(e))
+            raise UpdateFailed(f"处理数据失败: {str(e)}") from e
+
+    @property
+    def _hub_account(self):
+        """在调度中心登记的账号标识"""
+        return self._entry_id or self.user
+
+    def _hub_request_slot(self, priority: int = COMMAND_PRIORITY_NORMAL):
+        """返回占用全局请求预算的上下文，未接入调度中心时不做限制"""
+        if self.hub is None:
+            return contextlib.nullcontext()
+        return self.hub.async_request_slot(self._hub_account, priority)
+
+    @callback
+    def async_stagger_next_poll(self):
+        """多账号时把下一次轮询推迟到其他账号轮询之间的空档"""
+        if self.hub is None or self.push_connected:
+            return
+        delay = self.hub.async_poll_delay(self._hub_account, self._current_interval)
+        if delay is None:
+            return
+        # 之后每次轮询处理完成时 _apply_update_interval 会重新对齐
+        self.update_interval = timedelta(seconds=delay)
+        if self._listeners:
+            self._schedule_refresh()
+
+    async def _async_get_home_room_body(self):
+        """请求一次homeRoom接口，返回原始响应体"""
+        url = f"{self.home_room_url}?user={self.user}"
+        async with self._request_semaphore, self._hub_request_slot(), \
+                self.session.get(url, timeout=self._timeout) as response:
+            _LOGGER.debug("API request URL: %s, Status: %d", url, response.status)
+            if response.status != 200:
+                response.raise_for_status()
+            return await response.read()
+
+    def _process_home_room(self, body):
+        """解析homeRoom响应体，更新索引并返回设备列表"""
+        self.metrics.record_payload(len(body))
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        if digest == self._last_digest and self.data is not None:
+            # 响应与上一次完全相同，跳过解析、重建索引和分发
+            self.polls_skipped += 1
+            _LOGGER.debug("API响应未变化，跳过处理 (已跳过 %d 次)", self.polls_skipped)
+            if self.recorder is not None:
+                self.recorder.record_home_room(None)
+            self._adapt_interval(False)
+            return self.data
+        data = json_loads(body)
+        if data.get("code") != 0:
+            if self.recorder is not None:
+                self.recorder.record_home_room_error(data.get("code"))
+            _LOGGER.error("API返回错误: %s", data.get('msg'))
+            raise UpdateFailed(f"API返回错误: {data.get('msg')}")
+        if self.recorder is not None:
+            self.recorder.record_home_room(data.get("data", []))
+        devices = self._parse_devices(data.get("data", []))
+        _LOGGER.debug("API数据获取成功，共 %d 个设备", len(devices))
+        toggled = set()
+        if self.data is not None:
+            # 单次轮询缺少的设备不立即移除，连续多次缺少才视为已删除
+            devices, toggled = self._retain_missing_devices(devices)
+        changed = self._diff_snapshot(devices) | toggled
+        # 可用性变化不受分发分级限制
+        self._tier_bypass |= toggled
+        # 本地乐观更新过的topic即使云端数据没变也要用云端状态校正实体
+        dirty = self._take_dirty_topics() & {device.topic for device in devices}
+        self._tier_bypass |= dirty
+        confirmed = self.snapshot_stale
+        if confirmed:
+            # 第一次实时数据到达，所有实体都需要清除过期标记
+            self.snapshot_stale = False
+            changed |= {device.topic for device in devices}
+            self._tier_bypass |= changed
+        had_devices = self.data is not None
+        previous_topics = set(self._devices_by_topic)
+        self._rebuild_index(devices)
+        # 变化较慢的设备类型按各自的分发间隔合并后再更新实体
+        dispatch, released = self._async_apply_dispatch_tiers(changed | dirty)
+        self.changed_topics |= dispatch
+        if had_devices:
+            current_topics = set(self._devices_by_topic)
+            added = current_topics - previous_topics
+            removed = previous_topics - current_topics
+            if added or removed:
+                self._async_notify_device_changes(added, removed)
+        self._stale_topics.intersection_update(self._devices_by_topic)
+        self._async_track_staleness([
+            self._devices_by_topic[topic] for topic in changed if topic in self._devices_by_topic
+        ])
+        # 请求发出后才被修改的topic和等待移除的设备都需要下一次轮询完整处理
+        self._last_digest = None if self._dirty_topics or self._missing_polls else digest
+        self.polls_processed += 1
+        self._adapt_interval(bool(changed))
+        self._async_schedule_snapshot_save()
+        if confirmed or toggled or released or (dirty and not changed):
+            # 设备列表与快照或上一次相同时协调器不会通知监听器，需要主动分发；
+            # 消失的设备排在列表末尾时保留后的列表也与上一次相同；
+            # 到期释放的暂存变化来自之前的轮询，本次列表可能没有变化，而分级定时器刚被取消
+            self._async_dispatch_changes()
+        return devices
+
+    @property
+    def command_stats(self):
+        """返回命令发送与合并的计数"""
+        return {
+            "sent": self.commands_sent,
+            "coalesced": self.commands_coalesced,
+            "pending": len(self._pending_commands),
+            "rate_limited": self.command_queue_length,
+            "queued": len(self.outbox) if self.outbox is not None else 0,
+        }
+
+    @callback
+    def async_enable_recorder(self, path: str):
+        """开始把homeRoom响应和命令录制到 path，私钥不会写入文件"""
+        if self.recorder is not None:
+            return
+        self.recorder = TrafficRecorder(self.hass, path, secrets=(self.user,))
+        _LOGGER.info("开始录制巴法API流量到 %s", path)
+
+    async def async_enable_outbox(self):
+        """启用待发命令队列并恢复上次未发送的命令"""
+        if self.outbox is not None:
+            return
+        self.outbox = CommandOutbox(self.hass, self._entry_id)
+        await self.outbox.async_load()
+
+    @callback
+    def _async_schedule_outbox_drain(self):
+        """队列中有命令且没有正在进行的重发时，启动一次重发"""
+        if not self.outbox or self.breaker.is_open:
+            return
+        if self._outbox_task is not None and not self._outbox_task.done():
+            return
+        self._outbox_task = self.hass.async_create_background_task(
+            self._async_drain_outbox(), f"{DOMAIN}_outbox_drain"
+        )
+
+    async def _async_drain_outbox(self, concurrency: int = DEFAULT_BATCH_CONCURRENCY):
+        """按入队顺序以有限并发重发队列中的命令"""
+        entries = self.outbox.pending()
+        if not entries:
+            return
+        _LOGGER.info("巴法API已恢复，重发 %d 条待发送命令", len(entries))
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def _async_replay(entry):
+            async with semaphore:
+                if not self.outbox.is_current(entry):
+                    # 等待期间已有新的命令发出或入队
                     return False
-                result = await response.text()
-                _LOGGER.debug("命令发送结果: %s", result)
-                return True
+                success = await self._async_post_command(
+                    entry["topic"], entry["msg"], entry["device_type"],
+                    COMMAND_PRIORITY_LOW
+                )
+            if success:
+                self.outbox.complete(entry)
+            return success
+
+        results = await asyncio.gather(*(_async_replay(entry) for entry in entries))
+        if any(results):
+            self._async_boost_polling()
+
+    async def async_send_command_debounced(self, topic: str, msg: str, device_type: int = 3):
+        """在短时间窗口内合并同一topic的命令，只发送最后一条，被直接发送的命令取代时返回False"""
+        pending = self._pending_commands.get(topic)
+        if pending is not None:
+            # 窗口内已有待发送命令，用最新的消息替换它
+            pending["msg"] = msg
+            pending["device_type"] = device_type
+            self.commands_coalesced += 1
+            _LOGGER.debug("合并topic %s 的命令，最新消息: %s", topic, msg)
+            return await asyncio.shield(pending["future"])
+
+        pending = {
+            "msg": msg,
+            "device_type": device_type,
+            "future": self.hass.loop.create_future(),
+        }
+        self._pending_commands[topic] = pending
+        task = self.hass.async_create_task(self._async_flush_command(topic, pending))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+        return await asyncio.shield(pending["future"])
+
+    async def _async_flush_command(self, topic: str, pending):
+        """等待合并窗口结束后发送该topic最新的命令"""
+        result = False
+        try:
+            await asyncio.sleep(COMMAND_DEBOUNCE_WINDOW)
+            if self._pending_commands.get(topic) is not pending:
+                # 已被直接发送的命令取代
+                return
+            del self._pending_commands[topic]
+            result = await self.async_send_command(topic, pending["msg"], pending["device_type"])
+        finally:
+            # 被取消或发送异常时也要让等待的调用方返回
+            if not pending["future"].done():
+                pending["future"].set_result(result)
+
+    async def async_send_command(self, topic: str, msg: str, device_type: int = 3,
+                                 priority: int = COMMAND_PRIORITY_NORMAL):
+        """向设备发送控制命令，普通优先级的关闭和停止命令提升为最高优先级"""
+        priority = command_priority(msg, priority)
+        requested_at = time.time()
+        seq = next(self._command_seq)
+        self._latest_command[topic] = seq
+        # 直接发送的命令会取代该topic尚未发出的合并命令
+        superseded = self._pending_commands.pop(topic, None)
+        if superseded is not None:
+            self.commands_coalesced += 1
+        result = await self._async_post_command(topic, msg, device_type, priority)
+        if self.recorder is not None:
+            self.recorder.record_command(topic, msg, device_type, result, requested_at)
+        if superseded is not None and not superseded["future"].done():
+            # 合并的命令没有发出，调用方不应再应用它的乐观状态
+            superseded["future"].set_result(False)
+        # 实体已乐观更新，下一次轮询用云端状态校正，命令失败时实体也能恢复真实状态
+        self._async_mark_dirty(topic)
+        if result:
+            # 命令改变了设备状态，之前的结果不能再复用
+            self._last_fetch_at = None
+            device = self._devices_by_topic.get(topic)
+            if device is not None and device.device_type in self._dispatch_tiers:
+                # 确认命令结果的轮询不受分发分级限制
+                self._tier_bypass.add(topic)
+            self._async_boost_polling()
+        if self.outbox is not None:
+            if result:
+                self.outbox.discard(topic)
+            elif self._latest_command.get(topic) == seq:
+                # 只保存最新的意图，被后续命令取代的失败命令不再重发
+                self.outbox.add(topic, msg, device_type)
+        if self._latest_command.get(topic) == seq:
+            del self._latest_command[topic]
+        return result
+
+    async def async_send_batch(self, commands, concurrency: int = DEFAULT_BATCH_CONCURRENCY, device_type: int = 3):
+        """以有限并发、低优先级批量发送 (topic, msg) 命令，返回逐条结果"""
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def _async_send_one(topic, msg):
+            async with semaphore:
+                success = await self.async_send_command(topic, msg, device_type, COMMAND_PRIORITY_LOW)
+            return {"topic": topic, "msg": msg, "success": success}
+
+        results = await asyncio.gather(
+            *(_async_send_one(topic, msg) for topic, msg in commands)
+        )
+        _LOGGER.debug("批量发送 %d 条命令，成功 %d 条", len(results),
+                      sum(1 for result in results if result["success"]))
+        return list(results)
+
+    @property
+    def command_queue_length(self):
+        """限速队列中等待发送的命令数"""
+        return sum(1 for item in self._command_queue if not item[2]["granted"].done())
+
+    async def _async_acquire_command_slot(self, topic: str, priority: int):
+        """在限速队列中排队，返回 (队列项, 取代它的队列项)，后者为None表示获得了发送时机"""
+        item = {
+            "topic": topic,
+            "priority": priority,
+            "granted": self.hass.loop.create_future(),
+            "done": self.hass.loop.create_future(),
+        }
+        if priority == COMMAND_PRIORITY_HIGH:
+            # 关闭和停止命令取代同一topic仍在排队的设定值和挡位命令
+            for _, _, waiting in self._command_queue:
+                if (waiting["topic"] == topic and waiting["priority"] > priority
+                        and not waiting["granted"].done()):
+                    waiting["granted"].set_result(item)
+                    self.metrics.commands_preempted += 1
+                    _LOGGER.debug("topic %s 排队中的命令被高优先级命令取代", topic)
+        heapq.heappush(self._command_queue, (priority, next(self._command_seq), item))
+        queued_at = self.hass.loop.time()
+        if self._command_pump is None:
+            self._async_pump_command_queue()
+        try:
+            preempted_by = await item["granted"]
+        except asyncio.CancelledError:
+            if not item["done"].done():
+                item["done"].set_result(False)
+            raise
+        if preempted_by is None:
+            self.metrics.record_queue_wait(
+                COMMAND_PRIORITY_NAMES[priority], self.hass.loop.time() - queued_at
+            )
+        return item, preempted_by
+
+    @callback
+    def _async_pump_command_queue(self):
+        """按优先级放行一条命令，并在下一个限速时机继续"""
+        self._command_pump = None
+        while self._command_queue and self._command_queue[0][2]["granted"].done():
+            # 已被取代或取消的命令
+            heapq.heappop(self._command_queue)
+        if not self._command_queue:
+            return
+        now = self.hass.loop.time()
+        if now >= self._next_command_slot:
+            _, _, item = heapq.heappop(self._command_queue)
+            item["granted"].set_result(None)
+            self._next_command_slot = now + 1 / COMMAND_RATE_LIMIT
+            if not self._command_queue:
+                return
+        if self._command_pump is None:
+            self._command_pump = self.hass.loop.call_at(
+                self._next_command_slot, self._async_pump_command_queue
+            )
+
+    async def _async_post_command(self, topic: str, msg: str, device_type: int = 3,
+                                  priority: int = COMMAND_PRIORITY_NORMAL):
+        """按优先级限速后发送一条命令并记录请求统计"""
+        admission = self.breaker.allow_request()
+        if not admission:
+            self.metrics.record_command_short_circuit()
+            self._async_notify_metrics()
+            _LOGGER.warning("巴法API熔断中，未发送topic %s 的命令: %s", topic, msg)
+            return False
+        try:
+            item, preempted_by = await self._async_acquire_command_slot(topic, priority)
+        except asyncio.CancelledError:
+            if admission == REQUEST_PROBE:
+                self.breaker.release_probe()
+            raise
+        if preempted_by is not None:
+            # 被同一topic的关闭或停止命令取代，本命令没有发出
+            if admission == REQUEST_PROBE:
+                self.breaker.release_probe()
+            await asyncio.shield(preempted_by["done"])
+            item["done"].set_result(False)
+            return False
+
+        self.commands_sent += 1
+        start = time.perf_counter()
+        success = False
+        try:
+            # postmsg不是幂等请求，只在请求未到达服务器的连接错误时重试
+            send = lambda: self._async_post_msg(topic, msg, device_type, priority)
+            if priority == COMMAND_PRIORITY_LOW:
+                async with self._low_priority_semaphore:
+                    success = await async_retry(send, should_retry=is_connect_error)
+            else:
+                success = await async_retry(send, should_retry=is_connect_error)
+        except asyncio.TimeoutError:
+            _LOGGER.error("发送命令超时: %s", topic)
         except Exception as e:
             _LOGGER.error("发送命令异常: %s", str(e))
-            return False
+        except asyncio.CancelledError:
+            # 发送被取消时没有结果，不能一直占用半开探测名额
+            if admission == REQUEST_PROBE:
+                self.breaker.release_probe()
+            raise
+        finally:
+            if not item["done"].done():
+                item["done"].set_result(success)
+        if success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        self.metrics.record_command(time.perf_counter() - start, success)
+        self._async_notify_metrics()
+        return success
+
+    async def _async_post_msg(self, topic: str, msg: str, device_type: int = 3,
+                              priority: int = COMMAND_PRIORITY_NORMAL):
+        """调用postmsg接口发送一条命令，网络异常由调用方处理"""
+        url = self.post_msg_url
+        payload = f"user={self.user}&topic={topic}&msg={msg}&type={device_type}"
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded;charset=utf-8",
+            "User-Agent": "Dart/3.7 (dart:io)"
+        }
+        _LOGGER.debug("Sending command to topic: %s with msg: %s", topic, msg)
+        async with self._request_semaphore, self._hub_request_slot(priority), self.session.post(
+            url, data=payload, headers=headers, timeout=self._timeout
+        ) as response:
+            if response.status != 200:
+                _LOGGER.error("发送命令失败，状态码: %d", response.status)
+                return False
+            result = await response.text()
+            _LOGGER.debug("命令发送结果: %s", result)
+            return True
 
     async def async_close(self):
-        """关闭会话"""
-        if self.session:
-            await self.session.close()
-            self.session = None
\ No newline at end of file
+        """释放协调器持有的资源，共享会话由Home Assistant负责关闭"""
+        await self.async_stop_push()
+        self._async_cancel_stale_timer()
+        if self._command_pump is not None:
+            self._command_pump.cancel()
+            self._command_pump = None
+        if self._tier_timer is not None:
+            self._tier_timer.cancel()
+            self._tier_timer = None
+        for task in list(self._flush_tasks):
+            task.cancel()
+        for pending in self._pending_commands.values():
+            # 合并窗口内未发出的命令不再发送
+            if not pending["future"].done():
+                pending["future"].set_result(False)
+        self._pending_commands.clear()
+        if self._outbox_task is not None and not self._outbox_task.done():
+            self._outbox_task.cancel()
+        if self.recorder is not None:
+            await self.recorder.async_close()
+        self.session = None
\ No newline at end of file
@@ -1,24 +1,108 @@
 """巴法智能窗帘设备的实现"""
 
+from datetime import timedelta
+import time
+
 from homeassistant.components.cover import (
     CoverEntity,
     CoverDeviceClass,
     CoverEntityFeature
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    DOMAIN,
+    DEVICE_TYPE_CURTAIN,
+    CONF_CURTAIN_TRAVEL_TIMES,
+    DEFAULT_CURTAIN_TRAVEL_TIME,
+    COVER_ESTIMATE_INTERVAL,
+)
+from .base_device import BemfaSmartEntity, async_setup_device_entities
+
+
+class CoverTravelEstimator:
+    """按全程开合时间线性估算窗帘运行中的位置"""
+
+    def __init__(self, travel_time, position):
+        """travel_time 为从全关到全开所需的秒数"""
+        self.travel_time = travel_time
+        self._start_position = position
+        self._target = position
+        self._started_at = None # 开始运行的时间（time.monotonic），None表示静止
+        # 发出命令前的位置和预计到达时间，到达前轮询到该位置视为云端尚未更新
+        self._stale_position = None
+        self._arrives_at = None
+
+    @property
+    def is_moving(self):
+        """窗帘是否正在运行"""
+        return self._started_at is not None
+
+    @property
+    def target(self):
+        """运行的目标位置，静止时为当前位置"""
+        return self._target
+
+    @property
+    def direction(self):
+        """运行方向：1 打开，-1 关闭，0 静止"""
+        if not self.is_moving:
+            return 0
+        return 1 if self._target > self._start_position else -1
+
+    def position(self, now):
+        """估算 now 时刻的位置"""
+        if not self.is_moving:
+            return self._start_position
+        travelled = (now - self._started_at) / self.travel_time * 100
+        distance = self._target - self._start_position
+        if travelled >= abs(distance):
+            return self._target
+        return round(self._start_position + travelled * self.direction)
+
+    def start(self, target, now, stale_position=None):
+        """从当前估算位置开始向 target 运行，stale_position 为发出命令前轮询到的位置"""
+        self._start_position = self.position(now)
+        self._target = target
+        self._started_at = now if target != self._start_position else None
+        self._stale_position = stale_position
+        self._arrives_at = now + abs(target - self._start_position) / 100 * self.travel_time
+
+    def is_stale_report(self, position, now):
+        """轮询到的位置是否只是命令前的旧值：运行中且尚未到达预计时间"""
+        return (self.is_moving and position == self._stale_position
+                and now < self._arrives_at)
+
+    def stop(self, now):
+        """在当前估算位置停止，返回停止的位置"""
+        position = self.position(now)
+        self.set_position(position)
+        return position
+
+    def set_position(self, position):
+        """以确定的位置重置估算"""
+        self._start_position = position
+        self._target = position
+        self._started_at = None
+        self._stale_position = None
+        self._arrives_at = None
 
-from .const import DOMAIN, DEVICE_TYPE_CURTAIN
-from .base_device import BemfaSmartEntity
+    def tick(self, now):
+        """刷新运行状态，到达目标后停止，返回是否仍在运行"""
+        if self.is_moving and self.position(now) == self._target:
+            self.set_position(self._target)
+        return self.is_moving
 
 
 class BemfaCurtain(BemfaSmartEntity, CoverEntity):
     """巴法智能窗帘设备"""
 
-    def __init__(self, coordinator, config_entry, device_data):
+    def __init__(self, coordinator, config_entry, device_state):
         """初始化窗帘设备"""
-        super().__init__(coordinator, config_entry, device_data)
+        super().__init__(coordinator, config_entry, device_state)
         self._attr_device_class = CoverDeviceClass.CURTAIN
         self._attr_supported_features = (
             CoverEntityFeature.OPEN |
@@ -27,73 +111,136 @@ class BemfaCurtain(BemfaSmartEntity, CoverEntity):
             CoverEntityFeature.STOP
         )
         self._attr_current_cover_position = 0
+
+        # 配置了全程开合时间的窗帘在本地估算运行中的位置，不依赖轮询
+        travel_time = config_entry.options.get(CONF_CURTAIN_TRAVEL_TIMES, {}).get(
+            device_state.topic, DEFAULT_CURTAIN_TRAVEL_TIME
+        )
+        self._estimator = (
+            CoverTravelEstimator(travel_time, self._polled_position()) if travel_time > 0 else None
+        )
+        self._unsub_travel_timer = None
+        # 中途停止后云端仍记录着原来的目标位置，轮询到这个值时保留估算位置
+        self._stopped_target = None
         self._update_state()
 
+    def _polled_position(self):
+        """根据设备状态推算位置"""
+        on_state = bool(self.device_state.on)
+        position = self.device_state.position or 0
+        if not on_state:
+            return 0
+        if position > 0:
+            return position
+        # 如果没有位置信息，根据on状态判断
+        return 100
+
     def _update_state(self): # 保留 _update_state，供 _handle_coordinator_update 调用
         """更新窗帘状态"""
-        msg = self.device_data['msg']
-        on_state = msg.get('on', False)
-        position = msg.get('position', 0)
+        polled = self._polled_position()
+        if self._estimator is None:
+            self._apply_position(polled)
+            return
 
-        if not on_state:
-            self._attr_current_cover_position = 0
-            self._attr_is_closed = True
-        elif position > 0:
-            self._attr_current_cover_position = position
-            self._attr_is_closed = position == 0
-        else:
-            # 如果没有位置信息，根据on状态判断
-            self._attr_current_cover_position = 100 if on_state else 0
-            self._attr_is_closed = not on_state
+        now = time.monotonic()
+        if self._estimator.is_moving:
+            # 确认轮询仍返回命令前的位置时继续按估算运行，避免位置跳回起点
+            if (polled != self._estimator.target
+                    and not self._estimator.is_stale_report(polled, now)):
+                # 窗帘被其他方式控制，向新的目标运行
+                self._start_travel(polled)
+        elif polled != self._stopped_target:
+            self._estimator.set_position(polled)
+            self._stopped_target = None
+        self._apply_position(self._estimator.position(now))
+
+    def _apply_position(self, position):
+        """更新位置相关的实体属性"""
+        direction = self._estimator.direction if self._estimator is not None else 0
+        self._attr_current_cover_position = position
+        # 运行中按估算位置判断，从全关开始打开时不再显示为已关闭
+        self._attr_is_closed = position == 0 and direction == 0
+        self._attr_is_opening = direction > 0
+        self._attr_is_closing = direction < 0
+
+    def _start_travel(self, target, stale_position=None):
+        """开始估算向 target 运行，运行期间定时刷新位置"""
+        self._estimator.start(target, time.monotonic(), stale_position)
+        self._stopped_target = None
+        if self._estimator.is_moving and self._unsub_travel_timer is None:
+            self._unsub_travel_timer = async_track_time_interval(
+                self.hass, self._async_travel_tick, timedelta(seconds=COVER_ESTIMATE_INTERVAL)
+            )
+
+    def _cancel_travel_timer(self):
+        """取消位置刷新定时器"""
+        if self._unsub_travel_timer is not None:
+            self._unsub_travel_timer()
+            self._unsub_travel_timer = None
+
+    @callback
+    def _async_travel_tick(self, _now):
+        """运行期间刷新估算位置，到达目标后停止刷新"""
+        now = time.monotonic()
+        if not self._estimator.tick(now):
+            self._cancel_travel_timer()
+        self._apply_position(self._estimator.position(now))
+        self.async_write_ha_state()
+
+    async def async_will_remove_from_hass(self):
+        """实体移除时取消定时器"""
+        self._cancel_travel_timer()
+        await super().async_will_remove_from_hass()
 
     @property
     def device_type(self):
         """返回设备类型"""
         return DEVICE_TYPE_CURTAIN
 
+    async def _async_move_to(self, on, position):
+        """乐观更新到目标位置，配置了运行时间时改为估算运行过程"""
+        previous = self._polled_position()
+        self.device_state = self.device_state.replace(on=on, position=position)
+        if self._estimator is None:
+            self._apply_position(position)
+        else:
+            self._start_travel(position, previous)
+            self._apply_position(self._estimator.position(time.monotonic()))
+        self.async_write_ha_state() # 立即更新状态
+
     async def async_open_cover(self, **kwargs):
         """打开窗帘"""
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         await self.coordinator.async_send_command(topic, "on")
-
-        self.device_data['msg']['on'] = True
-        self.device_data['msg']['position'] = 100
-        self._attr_current_cover_position = 100
-        self._attr_is_closed = False
-        self.async_write_ha_state() # 立即更新状态
+        await self._async_move_to(True, 100)
 
     async def async_close_cover(self, **kwargs):
         """关闭窗帘"""
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         await self.coordinator.async_send_command(topic, "off")
-
-        self.device_data['msg']['on'] = False
-        self.device_data['msg']['position'] = 0
-        self._attr_current_cover_position = 0
-        self._attr_is_closed = True
-        self.async_write_ha_state() # 立即更新状态
+        await self._async_move_to(False, 0)
 
     async def async_set_cover_position(self, position: int, **kwargs):
         """设置窗帘位置"""
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         msg = f"on#{position}"
-        await self.coordinator.async_send_command(topic, msg)
-
-        self.device_data['msg']['on'] = True
-        self.device_data['msg']['position'] = position
-        self._attr_current_cover_position = position
-        self._attr_is_closed = position == 0
-        self.async_write_ha_state() # 立即更新状态
+        if not await self.coordinator.async_send_command_debounced(topic, msg):
+            # 发送失败或已被停止命令取代，不再向该位置运行
+            return
+        await self._async_move_to(True, position)
 
     async def async_stop_cover(self, **kwargs):
         """停止窗帘"""
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         await self.coordinator.async_send_command(topic, "pause")
 
-        # 停止时保持当前位置
+        # 停止时保持当前位置，运行中则停在估算的位置
+        if self._estimator is not None and self._estimator.is_moving:
+            self._stopped_target = self._estimator.target
+            self._cancel_travel_timer()
+            self._apply_position(self._estimator.stop(time.monotonic()))
         self.async_write_ha_state() # 立即更新状态
 
-
 async def async_setup_entry(
     hass: HomeAssistant,
     config_entry: ConfigEntry,
@@ -101,11 +248,9 @@ async def async_setup_entry(
 ) -> None:
     """设置巴法智能窗帘平台"""
     coordinator = hass.data[DOMAIN][config_entry.entry_id]
-    
-    entities = []
-    for device_data in coordinator.data:
-        if device_data.get('id') == DEVICE_TYPE_CURTAIN:
-            entities.append(BemfaCurtain(coordinator, config_entry, device_data))
-    
-    if entities:
-        async_add_entities(entities)
\ No newline at end of file
+
+    async_setup_device_entities(
+        coordinator, config_entry, async_add_entities, {
+            DEVICE_TYPE_CURTAIN: lambda device_state: [BemfaCurtain(coordinator, config_entry, device_state)],
+        }
+    )
\ No newline at end of file
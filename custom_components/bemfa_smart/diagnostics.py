@@ -0,0 +1,40 @@
+"""巴法智能集成的诊断信息"""
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_USER
+
+TO_REDACT = {CONF_USER}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    """返回配置项的诊断信息"""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    device_counts = {}
+    for device in coordinator.data or []:
+        device_type = device.device_type
+        device_counts[device_type] = device_counts.get(device_type, 0) + 1
+
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "update_interval": str(coordinator.update_interval),
+            "snapshot_stale": coordinator.snapshot_stale,
+            "push_connected": coordinator.push_connected,
+            "device_counts": device_counts,
+            "poll_stats": coordinator.poll_stats,
+            "command_stats": coordinator.command_stats,
+            "stale_devices": coordinator.stale_count,
+            "breaker": coordinator.breaker.as_dict(),
+            "outbox": coordinator.outbox.as_dict() if coordinator.outbox is not None else None,
+            "recorder": coordinator.recorder.as_dict() if coordinator.recorder is not None else None,
+        },
+        "hub": coordinator.hub.as_dict(entry.entry_id) if coordinator.hub is not None else None,
+        "metrics": coordinator.metrics.as_dict(),
+    }
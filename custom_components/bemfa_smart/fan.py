@@ -11,7 +11,7 @@ from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from .const import DOMAIN, DEVICE_TYPE_FAN, CONF_FAN_SPEED_LEVELS, DEFAULT_FAN_SPEED_LEVELS # 导入旧常量
 from .config_flow import CONF_FAN_SPECIFIC_SPEED_LEVELS # 导入新常量
-from .base_device import BemfaSmartEntity
+from .base_device import BemfaSmartEntity, async_setup_device_entities
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -19,14 +19,14 @@ _LOGGER = logging.getLogger(__name__)
 class BemfaFan(BemfaSmartEntity, FanEntity):
     """巴法智能风扇设备"""
 
-    def __init__(self, coordinator, config_entry, device_data):
+    def __init__(self, coordinator, config_entry, device_state):
         """初始化风扇设备"""
-        super().__init__(coordinator, config_entry, device_data)
+        super().__init__(coordinator, config_entry, device_state)
         
         # 尝试从配置中获取当前风扇的特定挡位数
         fan_levels_by_topic = config_entry.options.get("fan_levels_by_topic", {})
         self._max_fan_levels = fan_levels_by_topic.get(
-            device_data['topic'], # 使用当前风扇的topic作为键
+            device_state.topic, # 使用当前风扇的topic作为键
             DEFAULT_FAN_SPEED_LEVELS # 如果未找到，则使用默认值
         )
         
@@ -34,7 +34,7 @@ class BemfaFan(BemfaSmartEntity, FanEntity):
         if self._max_fan_levels < 1:
             self._max_fan_levels = DEFAULT_FAN_SPEED_LEVELS
             _LOGGER.warning("Fan %s configured with invalid speed levels (%s), defaulting to %s.",
-                            self.name, fan_levels_by_topic.get(device_data['topic']), self._max_fan_levels)
+                            self.name, fan_levels_by_topic.get(device_state.topic), self._max_fan_levels)
 
         # 计算每个挡位的百分比步长
         self._attr_percentage_step = 100 / self._max_fan_levels # 确保 _max_fan_levels > 0 
@@ -46,17 +46,16 @@ class BemfaFan(BemfaSmartEntity, FanEntity):
             FanEntityFeature.TURN_OFF
         )
         self._attr_oscillating = False
-        self._attr_is_on = device_data['msg'].get('on', False)
+        self._attr_is_on = bool(device_state.on)
 
         self._attr_percentage = 0
         self._update_state()
 
     def _update_state(self):
         """更新风扇状态"""
-        msg = self.device_data['msg']
-        new_is_on = msg.get('on', False)
+        new_is_on = bool(self.device_state.on)
 
-        new_speed_level = msg.get('level')
+        new_speed_level = self.device_state.level
 
         if new_is_on:
             if new_speed_level is None or new_speed_level == 0:
@@ -64,7 +63,7 @@ class BemfaFan(BemfaSmartEntity, FanEntity):
             new_speed_level = min(new_speed_level, self._max_fan_levels)
             
             self._attr_percentage = self._level_to_percentage(new_speed_level)
-            self._attr_oscillating = msg.get('shake', 0) == 1
+            self._attr_oscillating = self.device_state.shake == 1
         else:
             self._attr_percentage = 0
             self._attr_oscillating = False
@@ -126,7 +125,7 @@ class BemfaFan(BemfaSmartEntity, FanEntity):
     async def async_set_percentage(self, percentage: int):
         """设置风扇百分比速度 (包含开关功能)"""
         _LOGGER.debug("BemfaFan async_set_percentage called for %s with percentage: %s", self.name, percentage)
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         level = self._percentage_to_level(percentage)
 
         if percentage == 0:
@@ -135,10 +134,15 @@ class BemfaFan(BemfaSmartEntity, FanEntity):
             shake_state = 1 if self._attr_oscillating else 0
             msg = f"on#{level}#{shake_state}"
 
-        await self.coordinator.async_send_command(topic, msg)
+        if percentage == 0:
+            await self.coordinator.async_send_command(topic, msg)
+        else:
+            # 拖动滑块时会连续调用，合并为最后一次
+            if not await self.coordinator.async_send_command_debounced(topic, msg):
+                # 发送失败或已被关闭命令取代，不覆盖之后的状态
+                return
 
-        self.device_data['msg']['on'] = (percentage > 0)
-        self.device_data['msg']['level'] = level
+        self.device_state = self.device_state.replace(on=(percentage > 0), level=level)
         self._attr_percentage = self._level_to_percentage(level)
         self._attr_is_on = (percentage > 0)
         self.async_write_ha_state()
@@ -146,7 +150,7 @@ class BemfaFan(BemfaSmartEntity, FanEntity):
     async def async_oscillate(self, oscillating: bool):
         """设置风扇摇头"""
         _LOGGER.debug("BemfaFan async_oscillate called for %s with oscillating: %s", self.name, oscillating)
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         
         if not self.is_on:
             _LOGGER.debug("风扇未开启，自动开启到最低挡位并摇头。")
@@ -159,7 +163,7 @@ class BemfaFan(BemfaSmartEntity, FanEntity):
         msg = f"on#{current_level}#{shake}"
         await self.coordinator.async_send_command(topic, msg)
 
-        self.device_data['msg']['shake'] = shake
+        self.device_state = self.device_state.replace(shake=shake)
         self._attr_oscillating = oscillating
         self.async_write_ha_state()
 
@@ -172,10 +176,8 @@ async def async_setup_entry(
     """设置巴法智能风扇平台"""
     coordinator = hass.data[DOMAIN][config_entry.entry_id]
 
-    entities = []
-    for device_data in coordinator.data:
-        if device_data.get('id') == DEVICE_TYPE_FAN:
-            entities.append(BemfaFan(coordinator, config_entry, device_data))
-
-    if entities:
-        async_add_entities(entities)
\ No newline at end of file
+    async_setup_device_entities(
+        coordinator, config_entry, async_add_entities, {
+            DEVICE_TYPE_FAN: lambda device_state: [BemfaFan(coordinator, config_entry, device_state)],
+        }
+    )
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""巴法智能多账号调度中心
+
+同一个Home Assistant中配置了多个巴法账号时，各账号的协调器共用这里的连接池、
+并发上限和请求速率预算，并把各账号的轮询错开到扫描间隔内的不同时刻。
+连接名额按命令优先级分配，其他账号的批量命令不会挡住本账号的关闭和停止命令。
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+import heapq
+import itertools
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .const import DATA_HUB, HUB_MAX_CONNECTIONS, HUB_REQUEST_RATE, COMMAND_PRIORITY_NORMAL
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AccountLoad:
+    """单个账号通过调度中心发起的请求统计"""
+
+    def __init__(self):
+        """初始化统计数据"""
+        self.requests = 0
+        self.in_flight = 0
+        self.wait_total = 0.0 # 等待并发和速率预算的累计时间（秒）
+        self.busy_total = 0.0 # 请求占用连接的累计时间（秒）
+        self.last_poll_at = None # 最近一次轮询开始的时间（loop时间）
+        self.poll_delay = None # 为错开轮询而推迟的秒数
+
+    def as_dict(self):
+        """导出为诊断信息使用的字典"""
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "mean_wait_ms": self.wait_total / self.requests * 1000 if self.requests else None,
+            "mean_busy_ms": self.busy_total / self.requests * 1000 if self.requests else None,
+            "poll_delay": self.poll_delay,
+        }
+
+
+class BemfaHub:
+    """所有巴法账号共用的请求调度"""
+
+    def __init__(self, hass: HomeAssistant, max_connections: int = HUB_MAX_CONNECTIONS,
+                 request_rate: float = HUB_REQUEST_RATE):
+        """初始化调度中心"""
+        self.hass = hass
+        # 所有账号共用Home Assistant的会话，即同一个连接池
+        self.session = async_get_clientsession(hass)
+        self.max_connections = max_connections
+        self.request_rate = request_rate
+        self._in_flight = 0 # 已占用的连接名额
+        self._waiters = [] # 等待连接名额的 (优先级, 入队顺序, future)
+        self._waiter_seq = itertools.count()
+        self._next_request_slot = 0.0 # 下一个请求最早可发起的时间（loop时间）
+        self._loads = {} # 账号 -> AccountLoad
+
+    def __len__(self):
+        """已登记的账号数"""
+        return len(self._loads)
+
+    @callback
+    def async_register(self, account):
+        """登记账号，返回的回调在账号卸载时注销"""
+        self._loads.setdefault(account, AccountLoad())
+
+        @callback
+        def unregister():
+            self._loads.pop(account, None)
+
+        return unregister
+
+    async def _async_acquire(self, priority):
+        """占用一个连接名额，名额用完时按 (优先级, 入队顺序) 排队"""
+        if self._in_flight < self.max_connections and not self._waiters:
+            self._in_flight += 1
+            return
+        future = self.hass.loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._waiter_seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已经分到名额但随即被取消，转交给下一个等待者
+                self._release()
+            raise
+
+    def _release(self):
+        """释放连接名额，有等待者时直接转交给优先级最高的一个"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    @asynccontextmanager
+    async def async_request_slot(self, account, priority: int = COMMAND_PRIORITY_NORMAL):
+        """在全局并发和速率预算内占用一个请求时机，优先级数值越小越先获得连接"""
+        load = self._loads.setdefault(account, AccountLoad())
+        loop = self.hass.loop
+        queued_at = loop.time()
+        await self._async_acquire(priority)
+        try:
+            now = loop.time()
+            slot = max(now, self._next_request_slot)
+            self._next_request_slot = slot + 1 / self.request_rate
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            started = loop.time()
+            load.wait_total += started - queued_at
+            load.requests += 1
+            load.in_flight += 1
+            try:
+                yield
+            finally:
+                load.in_flight -= 1
+                load.busy_total += loop.time() - started
+        finally:
+            self._release()
+
+    @callback
+    def async_record_poll(self, account):
+        """记录账号开始一次轮询，用于计算各账号的轮询相位"""
+        self._loads.setdefault(account, AccountLoad()).last_poll_at = self.hass.loop.time()
+
+    @callback
+    def async_poll_delay(self, account, interval, minimum=1):
+        """计算账号下一次轮询应推迟到多少秒后（不少于 minimum），使其落在其他账号轮询之间的最大空档中"""
+        now = self.hass.loop.time()
+        # 其他账号下一次轮询相对现在的时刻，按本账号的间隔取模
+        phases = sorted(
+            (load.last_poll_at - now) % interval
+            for other, load in self._loads.items()
+            if other != account and load.last_poll_at is not None
+        )
+        if not phases:
+            return None
+        start, gap = phases[-1], phases[0] + interval - phases[-1]
+        for previous, current in zip(phases, phases[1:]):
+            if current - previous > gap:
+                start, gap = previous, current - previous
+        delay = (start + gap / 2) % interval
+        while delay < minimum:
+            # 太近时顺延一个间隔，避免刚完成刷新就立即再次轮询
+            delay += interval
+        self._loads[account].poll_delay = round(delay, 3)
+        _LOGGER.debug("账号 %s 的下一次轮询推迟 %.1f 秒，与其他 %d 个账号错开", account, delay, len(phases))
+        return delay
+
+    def as_dict(self, account=None):
+        """导出为诊断信息使用的字典，account 为当前账号"""
+        return {
+            "accounts": len(self._loads),
+            "max_connections": self.max_connections,
+            "request_rate": self.request_rate,
+            "in_flight": sum(load.in_flight for load in self._loads.values()),
+            "waiting": sum(1 for _, _, future in self._waiters if not future.done()),
+            "requests": sum(load.requests for load in self._loads.values()),
+            "account_load": self._loads[account].as_dict() if account in self._loads else None,
+        }
+
+
+@callback
+def async_get_hub(hass: HomeAssistant) -> BemfaHub:
+    """返回域级别的调度中心，不存在时创建"""
+    hub = hass.data.get(DATA_HUB)
+    if hub is None:
+        hub = hass.data[DATA_HUB] = BemfaHub(hass)
+    return hub
@@ -11,19 +11,19 @@ from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from .const import DOMAIN, DEVICE_TYPE_LIGHT
-from .base_device import BemfaSmartEntity
+from .base_device import BemfaSmartEntity, async_setup_device_entities
 
 
 class BemfaLight(BemfaSmartEntity, LightEntity):
     """巴法智能灯光设备"""
 
-    def __init__(self, coordinator, config_entry, device_data):
+    def __init__(self, coordinator, config_entry, device_state):
         """初始化灯光设备"""
-        super().__init__(coordinator, config_entry, device_data)
+        super().__init__(coordinator, config_entry, device_state)
         self._attr_supported_color_modes = {ColorMode.ONOFF}
         self._attr_color_mode = ColorMode.ONOFF
 
-        self._attr_is_on = device_data['msg'].get('on', False)
+        self._attr_is_on = bool(device_state.on)
 
     @property
     def device_type(self):
@@ -33,27 +33,27 @@ class BemfaLight(BemfaSmartEntity, LightEntity):
     @property
     def is_on(self):
         """返回灯光是否开启"""
-        return self.device_data['msg'].get('on', False)
+        return bool(self.device_state.on)
 
     async def async_turn_on(self, **kwargs):
         """开启灯光"""
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         await self.coordinator.async_send_command(topic, "on")
-        self.device_data['msg']['on'] = True
+        self.device_state = self.device_state.replace(on=True)
         self._attr_color_mode = ColorMode.ONOFF
         self.async_write_ha_state() # 立即更新状态
 
     async def async_turn_off(self, **kwargs):
         """关闭灯光"""
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         await self.coordinator.async_send_command(topic, "off")
-        self.device_data['msg']['on'] = False
+        self.device_state = self.device_state.replace(on=False)
         self._attr_color_mode = ColorMode.ONOFF
         self.async_write_ha_state() # 立即更新状态
 
     def _update_state(self): # 保留 _update_state，供 _handle_coordinator_update 调用
         """更新灯光实体状态"""
-        self._attr_is_on = self.device_data['msg'].get('on', False)
+        self._attr_is_on = bool(self.device_state.on)
         self._attr_color_mode = ColorMode.ONOFF
 
 
@@ -64,11 +64,9 @@ async def async_setup_entry(
 ) -> None:
     """设置巴法智能灯光平台"""
     coordinator = hass.data[DOMAIN][config_entry.entry_id]
-    
-    entities = []
-    for device_data in coordinator.data:
-        if device_data.get('id') == DEVICE_TYPE_LIGHT:
-            entities.append(BemfaLight(coordinator, config_entry, device_data))
-    
-    if entities:
-        async_add_entities(entities)
\ No newline at end of file
+
+    async_setup_device_entities(
+        coordinator, config_entry, async_add_entities, {
+            DEVICE_TYPE_LIGHT: lambda device_state: [BemfaLight(coordinator, config_entry, device_state)],
+        }
+    )
\ No newline at end of file
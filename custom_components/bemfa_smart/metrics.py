@@ -0,0 +1,134 @@
+"""巴法智能集成的运行时性能统计"""
+
+import math
+
+# 延迟直方图的桶上限（毫秒）
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, math.inf)
+# 响应体大小直方图的桶上限（字节）
+PAYLOAD_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, math.inf)
+
+
+class Histogram:
+    """固定桶的直方图，记录次数、总和、最大值和最近一次的值"""
+
+    def __init__(self, buckets):
+        """初始化直方图"""
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+        self.last = None
+
+    def record(self, value):
+        """记录一个观测值"""
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total += value
+        self.last = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        """平均值，没有观测值时返回None"""
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def as_dict(self):
+        """导出为诊断信息使用的字典"""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "max": self.max,
+            "last": self.last,
+            "buckets": {
+                ("+Inf" if math.isinf(bound) else str(bound)): count
+                for bound, count in zip(self.buckets, self.counts)
+            },
+        }
+
+
+class BemfaMetrics:
+    """协调器的请求与分发统计"""
+
+    def __init__(self):
+        """初始化统计数据"""
+        self.fetch_latency = Histogram(LATENCY_BUCKETS_MS)
+        self.command_latency = Histogram(LATENCY_BUCKETS_MS)
+        self.dispatch_time = Histogram(LATENCY_BUCKETS_MS)
+        self.payload_size = Histogram(PAYLOAD_BUCKETS)
+        self.command_queue_wait = {} # 优先级名称 -> 命令排队等待时间直方图
+        self.fetch_success = 0
+        self.fetch_failure = 0
+        self.fetch_short_circuited = 0 # 熔断中未发出的homeRoom请求，不计入失败和延迟
+        self.command_success = 0
+        self.command_failure = 0
+        self.command_short_circuited = 0 # 熔断中未发出的命令
+        self.consecutive_fetch_failures = 0
+        self.commands_preempted = 0
+
+    def record_fetch(self, seconds, success):
+        """记录一次homeRoom请求"""
+        self.fetch_latency.record(seconds * 1000)
+        if success:
+            self.fetch_success += 1
+            self.consecutive_fetch_failures = 0
+        else:
+            self.fetch_failure += 1
+            self.consecutive_fetch_failures += 1
+
+    def record_fetch_short_circuit(self):
+        """记录一次因熔断而未发出的homeRoom请求"""
+        self.fetch_short_circuited += 1
+
+    def record_command_short_circuit(self):
+        """记录一条因熔断而未发出的命令"""
+        self.command_short_circuited += 1
+
+    def record_command(self, seconds, success):
+        """记录一次postmsg请求"""
+        self.command_latency.record(seconds * 1000)
+        if success:
+            self.command_success += 1
+        else:
+            self.command_failure += 1
+
+    def record_queue_wait(self, priority, seconds):
+        """记录一条命令从排队到获得发送时机的等待时间"""
+        histogram = self.command_queue_wait.get(priority)
+        if histogram is None:
+            histogram = self.command_queue_wait[priority] = Histogram(LATENCY_BUCKETS_MS)
+        histogram.record(seconds * 1000)
+
+    def record_dispatch(self, seconds):
+        """记录一次向实体分发更新的耗时"""
+        self.dispatch_time.record(seconds * 1000)
+
+    def record_payload(self, size):
+        """记录一次homeRoom响应体大小"""
+        self.payload_size.record(size)
+
+    def as_dict(self):
+        """导出为诊断信息使用的字典"""
+        return {
+            "fetch_success": self.fetch_success,
+            "fetch_failure": self.fetch_failure,
+            "fetch_short_circuited": self.fetch_short_circuited,
+            "consecutive_fetch_failures": self.consecutive_fetch_failures,
+            "command_success": self.command_success,
+            "command_failure": self.command_failure,
+            "command_short_circuited": self.command_short_circuited,
+            "commands_preempted": self.commands_preempted,
+            "fetch_latency_ms": self.fetch_latency.as_dict(),
+            "command_latency_ms": self.command_latency.as_dict(),
+            "command_queue_wait_ms": {
+                priority: histogram.as_dict() for priority, histogram in self.command_queue_wait.items()
+            },
+            "dispatch_time_ms": self.dispatch_time.as_dict(),
+            "payload_bytes": self.payload_size.as_dict(),
+        }
@@ -0,0 +1,186 @@
+"""巴法智能设备状态模型
+
+协调器每次轮询把 homeRoom 返回的设备字典解析为下面的状态对象，
+只保留各平台实际使用的字段。状态对象不可修改，乐观更新通过 replace 生成新对象。
+"""
+
+from .const import (
+    DEVICE_TYPE_LIGHT,
+    DEVICE_TYPE_AIR_CONDITIONER,
+    DEVICE_TYPE_FAN,
+    DEVICE_TYPE_CURTAIN,
+    DEVICE_TYPE_SENSOR,
+    DEVICE_TYPE_OUTLET,
+    DEVICE_TYPE_SWITCH,
+    ATTR_ON,
+    ATTR_TEMPERATURE,
+    ATTR_HUMIDITY,
+    ATTR_UNIT,
+    ATTR_LAST_UPDATED,
+)
+
+
+class DeviceState:
+    """所有设备共有的字段"""
+
+    __slots__ = ("topic", "name", "device_type", "unix")
+
+    # msg 中的键 -> 属性名，由子类扩展
+    MSG_FIELDS = ()
+    # 子类声明的状态属性，创建子类时计算
+    STATE_SLOTS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.STATE_SLOTS = tuple(
+            slot for klass in reversed(cls.__mro__[:-2]) for slot in klass.__slots__
+        )
+
+    def __init__(self, topic, name, device_type, unix=0, **fields):
+        """初始化状态，fields 为子类声明的属性"""
+        setattr_ = object.__setattr__
+        setattr_(self, "topic", topic)
+        setattr_(self, "name", name)
+        setattr_(self, "device_type", device_type)
+        setattr_(self, "unix", unix)
+        for slot in self.STATE_SLOTS:
+            setattr_(self, slot, fields.get(slot))
+
+    @classmethod
+    def from_raw(cls, raw):
+        """从homeRoom返回的设备字典创建状态"""
+        msg = raw.get("msg")
+        if not isinstance(msg, dict):
+            msg = {}
+        fields = {attr: msg.get(key) for key, attr in cls.MSG_FIELDS}
+        return cls(raw["topic"], raw.get("name"), raw.get("id"), raw.get(ATTR_LAST_UPDATED) or 0, **fields)
+
+    def matches_raw(self, raw):
+        """设备字典是否与当前状态一致，未变化的设备不必重新创建状态"""
+        if (raw.get("id") != self.device_type or raw.get("name") != self.name
+                or (raw.get(ATTR_LAST_UPDATED) or 0) != self.unix):
+            return False
+        msg = raw.get("msg")
+        if not isinstance(msg, dict):
+            msg = {}
+        return all(msg.get(key) == getattr(self, attr) for key, attr in self.MSG_FIELDS)
+
+    def msg(self):
+        """还原为homeRoom格式的msg字典，只包含有值的字段"""
+        return {
+            key: getattr(self, attr) for key, attr in self.MSG_FIELDS
+            if getattr(self, attr) is not None
+        }
+
+    def as_raw(self):
+        """还原为homeRoom格式的设备字典，用于快照持久化"""
+        return {
+            "topic": self.topic,
+            "name": self.name,
+            "id": self.device_type,
+            ATTR_LAST_UPDATED: self.unix,
+            "msg": self.msg(),
+        }
+
+    def replace(self, **changes):
+        """返回修改了部分字段的新状态"""
+        values = {slot: getattr(self, slot) for slot in self.STATE_SLOTS}
+        values.update(changes)
+        return type(self)(
+            values.pop("topic", self.topic),
+            values.pop("name", self.name),
+            values.pop("device_type", self.device_type),
+            values.pop("unix", self.unix),
+            **values
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} 不可修改，请使用 replace()")
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(
+            getattr(self, slot) == getattr(other, slot)
+            for slot in DeviceState.__slots__ + self.STATE_SLOTS
+        )
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.topic!r}, {self.msg()!r})"
+
+
+class SwitchState(DeviceState):
+    """灯、插座和普通开关"""
+
+    __slots__ = ("on",)
+    MSG_FIELDS = ((ATTR_ON, "on"),)
+
+
+class FanState(DeviceState):
+    """风扇"""
+
+    __slots__ = ("on", "level", "shake")
+    MSG_FIELDS = ((ATTR_ON, "on"), ("level", "level"), ("shake", "shake"))
+
+
+class CurtainState(DeviceState):
+    """窗帘"""
+
+    __slots__ = ("on", "position")
+    MSG_FIELDS = ((ATTR_ON, "on"), ("position", "position"))
+
+
+class AirConditionerState(DeviceState):
+    """空调"""
+
+    __slots__ = ("on", "mode", "target_temperature", "level")
+    MSG_FIELDS = ((ATTR_ON, "on"), ("mode", "mode"), (ATTR_TEMPERATURE, "target_temperature"), ("level", "level"))
+
+
+class SensorState(DeviceState):
+    """温湿度传感器"""
+
+    __slots__ = ("temperature", "humidity", "units")
+    MSG_FIELDS = ((ATTR_TEMPERATURE, "temperature"), (ATTR_HUMIDITY, "humidity"))
+
+    @classmethod
+    def from_raw(cls, raw):
+        """传感器的单位在设备字典顶层"""
+        state = super().from_raw(raw)
+        units = raw.get(ATTR_UNIT)
+        if units:
+            object.__setattr__(state, "units", tuple(units))
+        return state
+
+    def matches_raw(self, raw):
+        """同时比较设备字典顶层的单位"""
+        units = raw.get(ATTR_UNIT)
+        return (tuple(units) if units else None) == self.units and super().matches_raw(raw)
+
+    def as_raw(self):
+        """单位写回设备字典顶层"""
+        raw = super().as_raw()
+        if self.units:
+            raw[ATTR_UNIT] = list(self.units)
+        return raw
+
+
+# 设备类型 -> 状态类，新增设备类型时在这里登记
+STATE_TYPES = {
+    DEVICE_TYPE_LIGHT: SwitchState,
+    DEVICE_TYPE_OUTLET: SwitchState,
+    DEVICE_TYPE_SWITCH: SwitchState,
+    DEVICE_TYPE_FAN: FanState,
+    DEVICE_TYPE_CURTAIN: CurtainState,
+    DEVICE_TYPE_AIR_CONDITIONER: AirConditionerState,
+    DEVICE_TYPE_SENSOR: SensorState,
+}
+
+
+def parse_device(raw):
+    """把homeRoom返回的设备字典解析为对应类型的状态，缺少topic时返回None"""
+    if not isinstance(raw, dict) or raw.get("topic") is None:
+        return None
+    return STATE_TYPES.get(raw.get("id"), DeviceState).from_raw(raw)
@@ -0,0 +1,122 @@
+"""发送失败命令的持久化待发队列"""
+
+import logging
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, OUTBOX_STORAGE_VERSION, OUTBOX_SAVE_DELAY, DEFAULT_OUTBOX_TTL
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def outbox_storage_key(entry_id: str) -> str:
+    """返回配置项对应的待发队列存储键"""
+    return f"{DOMAIN}.{entry_id}.outbox"
+
+
+class CommandOutbox:
+    """按topic保存最后一条发送失败的命令，恢复连接后按入队顺序重发"""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str | None = None, ttl: int = DEFAULT_OUTBOX_TTL):
+        """初始化待发队列，entry_id 为 None 时只保存在内存中"""
+        self.ttl = ttl
+        self._entries = {} # topic -> 命令，按入队顺序排列
+        self._store = (
+            Store(hass, OUTBOX_STORAGE_VERSION, outbox_storage_key(entry_id))
+            if entry_id is not None else None
+        )
+        self.replayed = 0 # 重发成功的命令数
+        self.expired = 0 # 过期丢弃的命令数
+
+    def __len__(self):
+        """队列中的命令数"""
+        return len(self._entries)
+
+    async def async_load(self):
+        """从存储中恢复上次未发送的命令"""
+        if self._store is None:
+            return
+        stored = await self._store.async_load()
+        if not stored or not isinstance(stored.get("commands"), list):
+            return
+        for entry in stored["commands"]:
+            if isinstance(entry, dict) and entry.get("topic"):
+                self._entries[entry["topic"]] = entry
+        self._drop_expired()
+        _LOGGER.debug("已恢复 %d 条待发送命令", len(self._entries))
+
+    @callback
+    def add(self, topic: str, msg: str, device_type: int, queued_at: float | None = None):
+        """加入一条命令，同一topic只保留最新的意图"""
+        now = time.time()
+        queued_at = now if queued_at is None else queued_at
+        # 先删除再插入，使最新的意图排到队尾
+        self._entries.pop(topic, None)
+        self._entries[topic] = {
+            "topic": topic,
+            "msg": msg,
+            "device_type": device_type,
+            "queued_at": queued_at,
+            "expires_at": queued_at + self.ttl,
+        }
+        _LOGGER.debug("命令已加入待发队列: %s -> %s (队列长度 %d)", topic, msg, len(self._entries))
+        self._schedule_save()
+
+    @callback
+    def discard(self, topic: str):
+        """新的命令已成功发送时丢弃该topic的旧意图"""
+        if self._entries.pop(topic, None) is not None:
+            self._schedule_save()
+
+    @callback
+    def pending(self):
+        """返回全部未过期的命令，按入队顺序排列"""
+        self._drop_expired()
+        return list(self._entries.values())
+
+    def is_current(self, entry):
+        """该命令是否仍是其topic最新的意图"""
+        return self._entries.get(entry["topic"]) is entry
+
+    @callback
+    def complete(self, entry):
+        """重发成功后移除命令，期间已有更新的意图时保留新的"""
+        if self.is_current(entry):
+            del self._entries[entry["topic"]]
+            self.replayed += 1
+            self._schedule_save()
+
+    def as_dict(self):
+        """导出为诊断信息使用的字典"""
+        return {
+            "queued": len(self._entries),
+            "replayed": self.replayed,
+            "expired": self.expired,
+        }
+
+    async def async_remove(self):
+        """删除持久化的队列"""
+        if self._store is not None:
+            await self._store.async_remove()
+
+    def _drop_expired(self):
+        """删除已过期的命令"""
+        now = time.time()
+        expired = [topic for topic, entry in self._entries.items() if entry.get("expires_at", 0) <= now]
+        for topic in expired:
+            entry = self._entries.pop(topic)
+            _LOGGER.info("待发送命令已过期，不再重发: %s -> %s", topic, entry.get("msg"))
+        self.expired += len(expired)
+        if expired:
+            self._schedule_save()
+
+    @callback
+    def _schedule_save(self):
+        """延迟保存队列"""
+        if self._store is None:
+            return
+        self._store.async_delay_save(
+            lambda: {"commands": list(self._entries.values())}, OUTBOX_SAVE_DELAY
+        )
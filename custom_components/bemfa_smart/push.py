@@ -0,0 +1,217 @@
+"""巴法智能TCP推送通道的实现"""
+
+import asyncio
+import logging
+
+from .const import (
+    DEVICE_TYPE_LIGHT,
+    DEVICE_TYPE_AIR_CONDITIONER,
+    DEVICE_TYPE_FAN,
+    DEVICE_TYPE_CURTAIN,
+    DEVICE_TYPE_SENSOR,
+    DEVICE_TYPE_OUTLET,
+    DEVICE_TYPE_SWITCH,
+    ATTR_ON,
+    ATTR_TEMPERATURE,
+    ATTR_HUMIDITY,
+    PUSH_HOST,
+    PUSH_PORT,
+    PUSH_HEARTBEAT_INTERVAL,
+    PUSH_READ_TIMEOUT,
+    PUSH_RECONNECT_MIN,
+    PUSH_RECONNECT_MAX,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def parse_push_msg(device_type, msg, current_msg):
+    """将推送的命令字符串转换为与homeRoom一致的msg字典，无法识别时返回None"""
+    new_msg = dict(current_msg or {})
+    parts = msg.split('#')
+    head = parts[0]
+
+    if device_type == DEVICE_TYPE_SENSOR:
+        # 传感器格式: #温度#湿度#
+        try:
+            if len(parts) > 1 and parts[1] != '':
+                new_msg[ATTR_TEMPERATURE] = float(parts[1])
+            if len(parts) > 2 and parts[2] != '':
+                new_msg[ATTR_HUMIDITY] = float(parts[2])
+        except ValueError:
+            return None
+        return new_msg
+
+    if head == "off":
+        new_msg[ATTR_ON] = False
+        if device_type == DEVICE_TYPE_CURTAIN:
+            new_msg['position'] = 0
+        return new_msg
+
+    if head == "pause":
+        # 暂停不改变已知状态
+        return new_msg
+
+    if head != "on":
+        return None
+
+    new_msg[ATTR_ON] = True
+    try:
+        if device_type == DEVICE_TYPE_CURTAIN:
+            new_msg['position'] = int(parts[1]) if len(parts) > 1 else 100
+        elif device_type == DEVICE_TYPE_FAN:
+            if len(parts) > 1:
+                new_msg['level'] = int(parts[1])
+            if len(parts) > 2:
+                new_msg['shake'] = int(parts[2])
+        elif device_type == DEVICE_TYPE_AIR_CONDITIONER:
+            if len(parts) > 1:
+                new_msg['mode'] = int(parts[1])
+            if len(parts) > 2:
+                new_msg[ATTR_TEMPERATURE] = int(parts[2])
+            if len(parts) > 3:
+                new_msg['level'] = int(parts[3])
+        elif device_type not in (DEVICE_TYPE_LIGHT, DEVICE_TYPE_OUTLET, DEVICE_TYPE_SWITCH):
+            return None
+    except ValueError:
+        return None
+    return new_msg
+
+
+def parse_push_line(line):
+    """解析一行推送数据，返回 (topic, msg)，不是消息推送时返回None"""
+    if not line.startswith("cmd=2&"):
+        return None
+    head, sep, msg = line.partition("&msg=")
+    if not sep:
+        return None
+    fields = dict(item.split("=", 1) for item in head.split("&") if "=" in item)
+    topic = fields.get("topic")
+    if not topic:
+        return None
+    return topic, msg
+
+
+class BemfaPushClient:
+    """订阅巴法云TCP接口并把推送的消息交给协调器"""
+
+    def __init__(self, hass, uid, topics, on_message, on_connection_change=None,
+                 host=PUSH_HOST, port=PUSH_PORT):
+        """初始化推送客户端"""
+        self.hass = hass
+        self.uid = uid
+        self.topics = list(topics)
+        self.host = host
+        self.port = port
+        self._on_message = on_message
+        self._on_connection_change = on_connection_change
+        self._task = None
+        self._writer = None
+        self.connected = False
+        self.messages_received = 0
+
+    def async_start(self):
+        """启动后台连接任务"""
+        if self._task is None:
+            self._task = self.hass.async_create_background_task(
+                self._async_run(), "bemfa_smart_push"
+            )
+
+    async def async_stop(self):
+        """停止推送并关闭连接"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._async_close()
+
+    async def async_set_topics(self, topics):
+        """更新订阅的topic列表，已连接时重新订阅"""
+        self.topics = list(topics)
+        if self._writer is not None:
+            await self._async_subscribe()
+
+    async def _async_subscribe(self):
+        """发送订阅命令"""
+        if not self.topics:
+            return
+        line = f"cmd=1&uid={self.uid}&topic={','.join(self.topics)}\r\n"
+        self._writer.write(line.encode())
+        await self._writer.drain()
+
+    async def _async_run(self):
+        """保持连接，断线后按指数退避重连"""
+        delay = PUSH_RECONNECT_MIN
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                await self._async_subscribe()
+                self._set_connected(True)
+                delay = PUSH_RECONNECT_MIN
+                _LOGGER.debug("推送通道已连接 %s:%d，订阅 %d 个topic", self.host, self.port, len(self.topics))
+                await self._async_read_loop(reader)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.TimeoutError) as e:
+                _LOGGER.warning("推送通道连接异常: %s，%d 秒后重连", str(e), delay)
+            except Exception:
+                # 任何意外错误都不能结束后台任务，按同样的退避重连
+                _LOGGER.exception("推送通道发生意外错误，%d 秒后重连", delay)
+            finally:
+                self._set_connected(False)
+                await self._async_close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, PUSH_RECONNECT_MAX)
+
+    async def _async_read_loop(self, reader):
+        """读取推送数据并定时发送心跳"""
+        heartbeat = self.hass.async_create_background_task(
+            self._async_heartbeat(), "bemfa_smart_push_heartbeat"
+        )
+        try:
+            while True:
+                raw = await asyncio.wait_for(reader.readline(), PUSH_READ_TIMEOUT)
+                if not raw:
+                    raise ConnectionResetError("服务器关闭了连接")
+                parsed = parse_push_line(raw.decode(errors="ignore").strip())
+                if parsed is None:
+                    continue
+                self.messages_received += 1
+                try:
+                    self._on_message(*parsed)
+                except Exception:
+                    # 单条消息处理失败不影响连接
+                    _LOGGER.exception("处理推送消息失败: %s", parsed)
+        finally:
+            heartbeat.cancel()
+
+    async def _async_heartbeat(self):
+        """定时发送ping保持连接"""
+        try:
+            while self._writer is not None:
+                await asyncio.sleep(PUSH_HEARTBEAT_INTERVAL)
+                self._writer.write(b"ping\r\n")
+                await self._writer.drain()
+        except OSError as e:
+            _LOGGER.debug("推送通道心跳发送失败: %s", str(e))
+
+    async def _async_close(self):
+        """关闭当前连接"""
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def _set_connected(self, connected):
+        """更新连接状态并通知协调器"""
+        if connected == self.connected:
+            return
+        self.connected = connected
+        if self._on_connection_change is not None:
+            self._on_connection_change(connected)
@@ -0,0 +1,215 @@
+"""homeRoom 响应和控制命令的流量录制
+
+录制文件为 JSON Lines，第一行是文件头，之后每行一条记录:
+
+* ``{"t": 毫秒, "k": "home", "set": {topic: 设备}, "del": [topic]}``
+  homeRoom 响应，只记录与上一次响应相比新增或变化的设备和消失的topic；
+  响应未变化时只有 ``t`` 和 ``k``，接口返回错误时记录 ``code``。
+* ``{"t": 毫秒, "k": "cmd", "topic": ..., "msg": ..., "type": ..., "ok": ...}``
+  通过 async_send_command 发送的命令。
+
+``t`` 为相对文件头 ``t0`` 的毫秒数。每次启用录制都会追加一个新的文件头。
+用户私钥和疑似凭据的字段在写入前被替换。
+"""
+
+import json
+import logging
+import os
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import DOMAIN, RECORDER_FORMAT_VERSION, RECORDER_FLUSH_DELAY, RECORDER_MAX_BYTES
+
+_LOGGER = logging.getLogger(__name__)
+
+REDACTED = "**REDACTED**"
+# 名称中包含这些词的字段视为凭据
+SCRUB_KEYWORDS = ("user", "uid", "openid", "secret", "token", "key", "password")
+
+
+def traffic_log_path(hass: HomeAssistant, entry_id: str) -> str:
+    """返回配置项的录制文件路径"""
+    return hass.config.path(f"{DOMAIN}.{entry_id}.traffic.jsonl")
+
+
+def scrub(value, secrets):
+    """递归替换凭据字段和与私钥相同的字符串"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if any(word in key.lower() for word in SCRUB_KEYWORDS) else scrub(item, secrets)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [scrub(item, secrets) for item in value]
+    if isinstance(value, str) and value in secrets:
+        return REDACTED
+    return value
+
+
+def decode_traffic(lines):
+    """把录制文件的各行还原为 (相对秒数, 类型, 内容) 序列
+
+    homeRoom 记录的内容为完整设备列表，命令记录的内容为 (topic, msg, type, ok)，
+    homeRoom 错误的内容为错误码。
+    """
+    devices = {}
+    first_t0 = None
+    base = 0.0 # 当前文件头相对第一个文件头的秒数
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if "v" in record:
+            # 新的录制会话，之后的差量从空设备列表开始
+            if record["v"] != RECORDER_FORMAT_VERSION:
+                raise ValueError(f"不支持的录制格式版本: {record['v']}")
+            if first_t0 is None:
+                first_t0 = record["t0"]
+            base = record["t0"] - first_t0
+            devices = {}
+            continue
+        if first_t0 is None:
+            raise ValueError("录制文件缺少文件头")
+        offset = base + record["t"] / 1000
+        if record["k"] == "cmd":
+            yield offset, "cmd", (record["topic"], record["msg"], record["type"], record["ok"])
+        elif "code" in record:
+            yield offset, "error", record["code"]
+        else:
+            for topic in record.get("del", ()):
+                devices.pop(topic, None)
+            devices.update(record.get("set", {}))
+            yield offset, "home", list(devices.values())
+
+
+class TrafficRecorder:
+    """把homeRoom响应和命令以差量形式追加到录制文件"""
+
+    def __init__(self, hass: HomeAssistant, path: str, secrets=()):
+        """初始化录制器，secrets 为需要从记录中去除的私钥等字符串"""
+        self.hass = hass
+        self.path = path
+        self._secrets = {secret for secret in secrets if secret}
+        self._t0 = time.time()
+        self._devices = {} # topic -> 上一次记录的设备（已去除凭据）
+        self._buffer = [json.dumps(
+            {"v": RECORDER_FORMAT_VERSION, "t0": round(self._t0, 3)}, separators=(",", ":")
+        )]
+        self._unsub_flush = None
+        self._bytes = None # 录制文件的大小，第一次写入前从已有文件读取
+        self.records = 0
+        self.stopped = False # 达到大小上限后停止录制
+
+    def _elapsed_ms(self, at=None):
+        """相对文件头的毫秒数"""
+        return int(((time.time() if at is None else at) - self._t0) * 1000)
+
+    @callback
+    def record_home_room(self, raw_devices):
+        """记录一次homeRoom响应，raw_devices 为 None 表示响应与上一次相同"""
+        record = {"t": self._elapsed_ms(), "k": "home"}
+        if raw_devices is not None:
+            current = {}
+            changed = {}
+            for raw in raw_devices:
+                if not isinstance(raw, dict) or raw.get("topic") is None:
+                    continue
+                device = scrub(raw, self._secrets)
+                topic = device["topic"]
+                current[topic] = device
+                if self._devices.get(topic) != device:
+                    changed[topic] = device
+            removed = [topic for topic in self._devices if topic not in current]
+            self._devices = current
+            if changed:
+                record["set"] = changed
+            if removed:
+                record["del"] = removed
+        self._append(record)
+
+    @callback
+    def record_home_room_error(self, code):
+        """记录homeRoom返回的错误码"""
+        self._append({"t": self._elapsed_ms(), "k": "home", "code": code})
+
+    @callback
+    def record_command(self, topic, msg, device_type, success, requested_at=None):
+        """记录一条命令及其发送结果，时间为发起请求的时刻"""
+        self._append({
+            "t": self._elapsed_ms(requested_at),
+            "k": "cmd",
+            "topic": scrub(topic, self._secrets),
+            "msg": msg,
+            "type": device_type,
+            "ok": success,
+        })
+
+    @callback
+    def _append(self, record):
+        """缓存一条记录，并安排批量写入"""
+        if self.stopped:
+            return
+        self._buffer.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        self.records += 1
+        if self._unsub_flush is None:
+            self._unsub_flush = async_call_later(self.hass, RECORDER_FLUSH_DELAY, self._async_flush_later)
+
+    async def _async_flush_later(self, _now):
+        """延迟写入定时器到期"""
+        self._unsub_flush = None
+        await self.async_flush()
+
+    async def async_flush(self):
+        """把缓存的记录写入文件"""
+        if not self._buffer:
+            return
+        if self._bytes is None:
+            # 文件以追加方式打开，大小上限要计入之前会话写入的内容
+            self._bytes = await self.hass.async_add_executor_job(self._file_size)
+            if self._bytes >= RECORDER_MAX_BYTES:
+                self._buffer = []
+                self._stop()
+                return
+        lines, self._buffer = self._buffer, []
+        data = "".join(f"{line}\n" for line in lines)
+        self._bytes += len(data.encode())
+        await self.hass.async_add_executor_job(self._write, data)
+        if self._bytes >= RECORDER_MAX_BYTES:
+            self._stop()
+
+    def _stop(self):
+        """达到大小上限后停止录制"""
+        if not self.stopped:
+            self.stopped = True
+            _LOGGER.warning("流量录制文件 %s 已达到大小上限，停止录制", self.path)
+
+    def _file_size(self):
+        """在线程池中读取已有录制文件的大小，文件不存在时为0"""
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def _write(self, data):
+        """在线程池中追加写入文件"""
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(data)
+
+    async def async_close(self):
+        """取消定时器并写入剩余记录"""
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+        await self.async_flush()
+
+    def as_dict(self):
+        """导出为诊断信息使用的字典"""
+        return {
+            "path": os.path.basename(self.path),
+            "records": self.records,
+            "bytes": self._bytes or 0,
+            "stopped": self.stopped,
+        }
@@ -0,0 +1,36 @@
+"""设备类型与平台的对应关系"""
+
+from .const import (
+    DEVICE_TYPE_LIGHT,
+    DEVICE_TYPE_AIR_CONDITIONER,
+    DEVICE_TYPE_FAN,
+    DEVICE_TYPE_CURTAIN,
+    DEVICE_TYPE_SENSOR,
+    DEVICE_TYPE_OUTLET,
+    DEVICE_TYPE_SWITCH,
+)
+
+PLATFORMS = ["light", "climate", "fan", "cover", "sensor", "switch"]
+
+# 诊断传感器始终需要传感器平台
+ALWAYS_LOADED_PLATFORMS = ("sensor",)
+
+# 设备类型 -> 为该类型创建实体的平台，新增设备类型时在这里登记
+DEVICE_TYPE_PLATFORMS = {
+    DEVICE_TYPE_LIGHT: ("light",),
+    DEVICE_TYPE_AIR_CONDITIONER: ("climate", "switch"),
+    DEVICE_TYPE_FAN: ("fan",),
+    DEVICE_TYPE_CURTAIN: ("cover",),
+    DEVICE_TYPE_SENSOR: ("sensor",),
+    DEVICE_TYPE_OUTLET: ("switch",),
+    DEVICE_TYPE_SWITCH: ("switch",),
+}
+
+
+def platforms_for_device_types(device_types):
+    """返回给定设备类型需要加载的平台，按 PLATFORMS 的顺序排列"""
+    needed = set(ALWAYS_LOADED_PLATFORMS)
+    for device_type in device_types:
+        needed.update(DEVICE_TYPE_PLATFORMS.get(device_type, ()))
+    return [platform for platform in PLATFORMS if platform in needed]
+
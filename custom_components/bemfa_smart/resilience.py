@@ -0,0 +1,127 @@
+"""巴法智能API请求的重试与熔断"""
+
+import asyncio
+import logging
+import random
+import time
+
+import aiohttp
+
+from .const import (
+    RETRY_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# allow_request 的返回值，拒绝时为假值
+REQUEST_DENIED = 0
+REQUEST_ALLOWED = 1
+REQUEST_PROBE = 2 # 获得了半开状态下唯一的探测名额
+
+
+def is_retryable_error(err):
+    """网络错误、超时和5xx响应可以重试，4xx不重试"""
+    if isinstance(err, aiohttp.ClientResponseError):
+        return err.status >= 500
+    return isinstance(err, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+def is_connect_error(err):
+    """请求未到达服务器的连接错误，非幂等请求也可以安全重试"""
+    # 服务器断开连接时请求可能已被处理，不能重试
+    return isinstance(err, aiohttp.ClientConnectorError)
+
+
+async def async_retry(func, should_retry=is_retryable_error, attempts=RETRY_ATTEMPTS,
+                      base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+    """按指数退避加随机抖动重试异步调用"""
+    for attempt in range(1, attempts + 1):
+        try:
+            return await func()
+        except Exception as err:
+            if attempt >= attempts or not should_retry(err):
+                raise
+            # full jitter: 在 [0, 退避上限] 之间随机等待
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            _LOGGER.debug("请求失败 (%s)，%.2f 秒后进行第 %d 次重试", err, delay, attempt + 1)
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后停止请求，冷却后放行一个探测请求"""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=BREAKER_RESET_TIMEOUT, on_state_change=None):
+        """初始化熔断器"""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._on_state_change = on_state_change
+
+    @property
+    def is_open(self):
+        """熔断器是否处于打开状态（半开探测中也视为打开）"""
+        return self.state != STATE_CLOSED
+
+    def allow_request(self):
+        """判断当前是否允许发出请求，返回值区分普通放行和半开探测"""
+        if self.state == STATE_CLOSED:
+            return REQUEST_ALLOWED
+        if self.state == STATE_OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(STATE_HALF_OPEN)
+        if self.state == STATE_HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return REQUEST_PROBE
+        return REQUEST_DENIED
+
+    def record_success(self):
+        """记录一次成功请求"""
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        if self.state != STATE_CLOSED:
+            self.opened_at = None
+            self._set_state(STATE_CLOSED)
+
+    def record_failure(self):
+        """记录一次失败请求"""
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == STATE_HALF_OPEN or (
+            self.state == STATE_CLOSED and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            self._set_state(STATE_OPEN)
+
+    def release_probe(self):
+        """持有探测名额的请求被取消或未发出、没有记录结果时释放名额"""
+        self._probe_in_flight = False
+
+    def as_dict(self):
+        """导出为诊断信息使用的字典"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+        }
+
+    def _set_state(self, state):
+        """切换状态并通知"""
+        if state == self.state:
+            return
+        _LOGGER.warning("巴法API熔断器状态: %s -> %s", self.state, state)
+        self.state = state
+        if self._on_state_change is not None:
+            self._on_state_change(state)
@@ -1,8 +1,10 @@
 """巴法智能传感器设备的实现"""
 
-from homeassistant.components.sensor import SensorEntity
+from homeassistant.components.sensor import SensorEntity, SensorStateClass
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfInformation, UnitOfTime
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.device_registry import DeviceEntryType
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from .const import (
@@ -10,25 +12,25 @@ from .const import (
     DEVICE_TYPE_SENSOR,
     ATTR_TEMPERATURE,
     ATTR_HUMIDITY,
-    ATTR_UNIT
+    NAME
 )
-from .base_device import BemfaSmartEntity
+from .base_device import BemfaSmartEntity, async_setup_device_entities
 
 
 class BemfaSensor(BemfaSmartEntity, SensorEntity):
     """巴法智能传感器设备"""
 
-    def __init__(self, coordinator, config_entry, device_data, sensor_type):
+    def __init__(self, coordinator, config_entry, device_state, sensor_type):
         """初始化传感器设备"""
-        super().__init__(coordinator, config_entry, device_data)
+        super().__init__(coordinator, config_entry, device_state)
         self.sensor_type = sensor_type
-        self._attr_unique_id = f"bemfa_{device_data['topic']}_{sensor_type}"
+        self._attr_unique_id = f"bemfa_{device_state.topic}_{sensor_type}"
         self._attr_native_unit_of_measurement = self._get_unit()
         self._update_state()
 
     def _get_unit(self):
         """获取传感器单位"""
-        units = self.device_data.get(ATTR_UNIT, [])
+        units = self.device_state.units
         if self.sensor_type == ATTR_TEMPERATURE and units and len(units) > 0:
             return units[0]
         if self.sensor_type == ATTR_HUMIDITY and units and len(units) > 1:
@@ -37,8 +39,10 @@ class BemfaSensor(BemfaSmartEntity, SensorEntity):
 
     def _update_state(self): # 保留 _update_state，供 _handle_coordinator_update 调用
         """更新传感器状态"""
-        msg = self.device_data['msg']
-        self._attr_native_value = msg.get(self.sensor_type)
+        if self.sensor_type == ATTR_TEMPERATURE:
+            self._attr_native_value = self.device_state.temperature
+        elif self.sensor_type == ATTR_HUMIDITY:
+            self._attr_native_value = self.device_state.humidity
 
     @property
     def device_type(self):
@@ -55,6 +59,68 @@ class BemfaSensor(BemfaSmartEntity, SensorEntity):
         return name_map.get(self.sensor_type, super().name)
 
 
+def _round(value, digits=1):
+    """四舍五入，None保持不变"""
+    return None if value is None else round(value, digits)
+
+
+# 诊断传感器: (key, 名称, 单位, 状态类别, 取值函数)
+DIAGNOSTIC_SENSORS = (
+    ("fetch_latency", "homeRoom 请求延迟", UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT,
+     lambda metrics: _round(metrics.fetch_latency.last)),
+    ("fetch_latency_mean", "homeRoom 平均请求延迟", UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT,
+     lambda metrics: _round(metrics.fetch_latency.mean)),
+    ("fetch_failures", "homeRoom 请求失败次数", None, SensorStateClass.TOTAL_INCREASING,
+     lambda metrics: metrics.fetch_failure),
+    ("command_latency_mean", "命令平均延迟", UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT,
+     lambda metrics: _round(metrics.command_latency.mean)),
+    ("command_failures", "命令失败次数", None, SensorStateClass.TOTAL_INCREASING,
+     lambda metrics: metrics.command_failure),
+    ("payload_size", "homeRoom 响应大小", UnitOfInformation.BYTES, SensorStateClass.MEASUREMENT,
+     lambda metrics: metrics.payload_size.last),
+    ("dispatch_time", "实体分发耗时", UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT,
+     lambda metrics: _round(metrics.dispatch_time.last, 3)),
+)
+
+
+class BemfaDiagnosticSensor(SensorEntity):
+    """显示协调器运行统计的诊断传感器"""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = False
+
+    def __init__(self, coordinator, config_entry, key, name, unit, state_class, value_fn):
+        """初始化诊断传感器"""
+        self.coordinator = coordinator
+        self._value_fn = value_fn
+        self._attr_unique_id = f"bemfa_{config_entry.entry_id}_{key}"
+        self._attr_name = f"{NAME} {name}"
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, config_entry.entry_id)},
+            "name": f"{NAME}账号",
+            "manufacturer": "巴法智能",
+            "entry_type": DeviceEntryType.SERVICE,
+        }
+        self._attr_native_value = value_fn(coordinator.metrics)
+
+    async def async_added_to_hass(self):
+        """当实体添加到Home Assistant时调用。"""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self.coordinator.async_add_metrics_listener(self._handle_metrics_update)
+        )
+
+    def _handle_metrics_update(self) -> None:
+        """统计数据更新时刷新状态"""
+        value = self._value_fn(self.coordinator.metrics)
+        if value == self._attr_native_value:
+            return
+        self._attr_native_value = value
+        self.async_write_ha_state()
+
+
 async def async_setup_entry(
     hass: HomeAssistant,
     config_entry: ConfigEntry,
@@ -62,15 +128,20 @@ async def async_setup_entry(
 ) -> None:
     """设置巴法智能传感器平台"""
     coordinator = hass.data[DOMAIN][config_entry.entry_id]
-    
-    entities = []
-    for device_data in coordinator.data:
-        if device_data.get('id') == DEVICE_TYPE_SENSOR:
-            msg = device_data.get('msg', {})
-            if ATTR_TEMPERATURE in msg:
-                entities.append(BemfaSensor(coordinator, config_entry, device_data, ATTR_TEMPERATURE))
-            if ATTR_HUMIDITY in msg:
-                entities.append(BemfaSensor(coordinator, config_entry, device_data, ATTR_HUMIDITY))
-    
-    if entities:
-        async_add_entities(entities)
\ No newline at end of file
+
+    def _create_entities(device_state):
+        entities = []
+        if device_state.temperature is not None:
+            entities.append(BemfaSensor(coordinator, config_entry, device_state, ATTR_TEMPERATURE))
+        if device_state.humidity is not None:
+            entities.append(BemfaSensor(coordinator, config_entry, device_state, ATTR_HUMIDITY))
+        return entities
+
+    async_setup_device_entities(
+        coordinator, config_entry, async_add_entities, {DEVICE_TYPE_SENSOR: _create_entities}
+    )
+
+    async_add_entities([
+        BemfaDiagnosticSensor(coordinator, config_entry, key, name, unit, state_class, value_fn)
+        for key, name, unit, state_class, value_fn in DIAGNOSTIC_SENSORS
+    ])
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""巴法智能集成的服务"""
+
+import logging
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+
+from .const import (
+    DOMAIN,
+    DEVICE_TYPE_LIGHT,
+    DEVICE_TYPE_AIR_CONDITIONER,
+    DEVICE_TYPE_FAN,
+    DEVICE_TYPE_CURTAIN,
+    DEVICE_TYPE_OUTLET,
+    DEVICE_TYPE_SWITCH,
+    DEFAULT_BATCH_CONCURRENCY,
+    API_MAX_CONNECTIONS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_SEND_BATCH = "send_batch"
+SERVICE_ALL_OFF = "all_off"
+
+ATTR_COMMANDS = "commands"
+ATTR_CONCURRENCY = "concurrency"
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_DEVICE_TYPES = "device_types"
+
+ACTION_TURN_ON = "turn_on"
+ACTION_TURN_OFF = "turn_off"
+ACTION_SET_POSITION = "set_position"
+
+# all_off 默认作用的设备类型
+DEFAULT_ALL_OFF_TYPES = [
+    DEVICE_TYPE_LIGHT,
+    DEVICE_TYPE_OUTLET,
+    DEVICE_TYPE_SWITCH,
+]
+
+COMMAND_SCHEMA = vol.All(
+    vol.Schema({
+        vol.Required("topic"): cv.string,
+        vol.Optional("msg"): cv.string,
+        vol.Optional("action"): vol.In([ACTION_TURN_ON, ACTION_TURN_OFF, ACTION_SET_POSITION]),
+        vol.Optional("position"): vol.All(vol.Coerce(int), vol.Range(min=0, max=100)),
+    }),
+    cv.has_at_least_one_key("msg", "action"),
+)
+
+SEND_BATCH_SCHEMA = vol.Schema({
+    vol.Required(ATTR_COMMANDS): vol.All(cv.ensure_list, [COMMAND_SCHEMA]),
+    vol.Optional(ATTR_CONCURRENCY, default=DEFAULT_BATCH_CONCURRENCY): vol.All(
+        vol.Coerce(int), vol.Range(min=1, max=API_MAX_CONNECTIONS)
+    ),
+    vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+})
+
+ALL_OFF_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_DEVICE_TYPES, default=DEFAULT_ALL_OFF_TYPES): vol.All(
+        cv.ensure_list,
+        [vol.In([
+            DEVICE_TYPE_LIGHT,
+            DEVICE_TYPE_OUTLET,
+            DEVICE_TYPE_SWITCH,
+            DEVICE_TYPE_CURTAIN,
+            DEVICE_TYPE_FAN,
+            DEVICE_TYPE_AIR_CONDITIONER,
+        ])],
+    ),
+    vol.Optional(ATTR_CONCURRENCY, default=DEFAULT_BATCH_CONCURRENCY): vol.All(
+        vol.Coerce(int), vol.Range(min=1, max=API_MAX_CONNECTIONS)
+    ),
+    vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+})
+
+
+def build_command_msg(device_type, action, position=None):
+    """按各平台实体使用的格式生成命令消息"""
+    if action == ACTION_TURN_OFF:
+        return "off"
+    if action == ACTION_SET_POSITION:
+        if device_type != DEVICE_TYPE_CURTAIN:
+            return None
+        return "on" if position is None else f"on#{position}"
+    if action == ACTION_TURN_ON:
+        if device_type == DEVICE_TYPE_AIR_CONDITIONER:
+            # 与空调开关实体的开启命令一致
+            return "on#1#25#1"
+        return "on"
+    return None
+
+
+def _get_coordinators(hass: HomeAssistant, entry_id=None):
+    """获取服务作用的协调器"""
+    coordinators = hass.data.get(DOMAIN, {})
+    if entry_id is None:
+        return list(coordinators.values())
+    if entry_id not in coordinators:
+        raise HomeAssistantError(f"未找到配置项: {entry_id}")
+    return [coordinators[entry_id]]
+
+
+async def _async_send_grouped(groups, concurrency):
+    """按协调器分组批量发送，返回逐条结果"""
+    results = []
+    for coordinator, commands in groups.items():
+        coordinator_results = await coordinator.async_send_batch(commands, concurrency)
+        if any(result["success"] for result in coordinator_results):
+            await coordinator.async_request_refresh()
+        results.extend(coordinator_results)
+    return results
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """注册巴法智能服务"""
+
+    async def async_handle_send_batch(call: ServiceCall):
+        """批量发送命令"""
+        coordinators = _get_coordinators(hass, call.data.get(ATTR_CONFIG_ENTRY_ID))
+        groups = {}
+        results = []
+        for command in call.data[ATTR_COMMANDS]:
+            topic = command["topic"]
+            coordinator = next(
+                (item for item in coordinators if item.get_device(topic) is not None),
+                None
+            )
+            if coordinator is None:
+                results.append({"topic": topic, "msg": command.get("msg"), "success": False, "error": "unknown_topic"})
+                continue
+            msg = command.get("msg")
+            if msg is None:
+                device_type = coordinator.get_device(topic).device_type
+                msg = build_command_msg(device_type, command["action"], command.get("position"))
+                if msg is None:
+                    results.append({"topic": topic, "msg": None, "success": False, "error": "unsupported_action"})
+                    continue
+            groups.setdefault(coordinator, []).append((topic, msg))
+
+        results.extend(await _async_send_grouped(groups, call.data[ATTR_CONCURRENCY]))
+        _LOGGER.debug("批量命令完成，共 %d 条，成功 %d 条", len(results),
+                      sum(1 for result in results if result["success"]))
+        return {"results": results}
+
+    async def async_handle_all_off(call: ServiceCall):
+        """关闭指定类型的全部设备"""
+        coordinators = _get_coordinators(hass, call.data.get(ATTR_CONFIG_ENTRY_ID))
+        groups = {}
+        for coordinator in coordinators:
+            commands = [
+                (topic, "off")
+                for device_type in call.data[ATTR_DEVICE_TYPES]
+                for topic in coordinator.get_topics_by_type(device_type)
+            ]
+            if commands:
+                groups[coordinator] = commands
+
+        results = await _async_send_grouped(groups, call.data[ATTR_CONCURRENCY])
+        return {"results": results}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SEND_BATCH,
+        async_handle_send_batch,
+        schema=SEND_BATCH_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_ALL_OFF,
+        async_handle_all_off,
+        schema=ALL_OFF_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
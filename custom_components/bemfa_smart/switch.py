@@ -7,8 +7,8 @@ from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 import logging
 
-from .const import DOMAIN, DEVICE_TYPE_AIR_CONDITIONER, DEVICE_TYPE_OUTLET, DEVICE_TYPE_SWITCH, ATTR_ON # 导入 DEVICE_TYPE_SWITCH
-from .base_device import BemfaSmartEntity
+from .const import DOMAIN, DEVICE_TYPE_AIR_CONDITIONER, DEVICE_TYPE_OUTLET, DEVICE_TYPE_SWITCH # 导入 DEVICE_TYPE_SWITCH
+from .base_device import BemfaSmartEntity, async_setup_device_entities
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -16,15 +16,15 @@ _LOGGER = logging.getLogger(__name__)
 class BemfaSmartSwitch(BemfaSmartEntity, SwitchEntity):
     """巴法智能通用开关设备 (类型: outlet 或 switch)"""
 
-    def __init__(self, coordinator, config_entry, device_data):
-        super().__init__(coordinator, config_entry, device_data)
-        self._attr_unique_id = f"bemfa_{device_data['topic']}_universal_switch" # 统一unique_id
-        self._attr_name = device_data['name']
+    def __init__(self, coordinator, config_entry, device_state):
+        super().__init__(coordinator, config_entry, device_state)
+        self._attr_unique_id = f"bemfa_{device_state.topic}_universal_switch" # 统一unique_id
+        self._attr_name = device_state.name
 
         # 根据设备ID设置设备类别，以获取正确图标
-        if device_data.get('id') == DEVICE_TYPE_OUTLET:
+        if device_state.device_type == DEVICE_TYPE_OUTLET:
             self._attr_device_class = SwitchDeviceClass.OUTLET
-        elif device_data.get('id') == DEVICE_TYPE_SWITCH:
+        elif device_state.device_type == DEVICE_TYPE_SWITCH:
             self._attr_device_class = SwitchDeviceClass.SWITCH # 默认为通用开关图标
         else:
             self._attr_device_class = None # 未知类型不设置
@@ -32,16 +32,15 @@ class BemfaSmartSwitch(BemfaSmartEntity, SwitchEntity):
         self._update_state()
 
     def _update_state(self):
-        msg = self.device_data['msg']
-        self._attr_is_on = msg.get(ATTR_ON, False)
+        self._attr_is_on = bool(self.device_state.on)
         _LOGGER.debug("BemfaSmartSwitch _update_state: %s is_on: %s", self.name, self.is_on)
 
     async def async_turn_on(self, **kwargs):
         _LOGGER.debug("BemfaSmartSwitch async_turn_on called for %s", self.name)
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         success = await self.coordinator.async_send_command(topic, "on")
         if success:
-            self.device_data['msg'][ATTR_ON] = True
+            self.device_state = self.device_state.replace(on=True)
             self.async_write_ha_state()
             _LOGGER.debug("BemfaSmartSwitch: %s 开启命令发送成功。", self.name)
         else:
@@ -49,10 +48,10 @@ class BemfaSmartSwitch(BemfaSmartEntity, SwitchEntity):
 
     async def async_turn_off(self, **kwargs):
         _LOGGER.debug("BemfaSmartSwitch async_turn_off called for %s", self.name)
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         success = await self.coordinator.async_send_command(topic, "off")
         if success:
-            self.device_data['msg'][ATTR_ON] = False
+            self.device_state = self.device_state.replace(on=False)
             self.async_write_ha_state()
             _LOGGER.debug("BemfaSmartSwitch: %s 关闭命令发送成功。", self.name)
         else:
@@ -60,49 +59,47 @@ class BemfaSmartSwitch(BemfaSmartEntity, SwitchEntity):
 
     @property
     def device_type(self):
-        # 这个属性通常不再直接用于类型判断，而是直接通过 device_data['id']
-        return self.device_data.get('id')
+        # 这个属性通常不再直接用于类型判断，而是直接通过 device_state.device_type
+        return self.device_state.device_type
 
 
 # --- 空调开关实体 ---
 class BemfaAirConditionerSwitch(BemfaSmartEntity, SwitchEntity):
     """巴法智能空调开关设备 (类型: aircondition)"""
 
-    def __init__(self, coordinator, config_entry, device_data):
-        super().__init__(coordinator, config_entry, device_data)
-        self._attr_unique_id = f"bemfa_{device_data['topic']}_ac_switch"
-        self._attr_name = f"{device_data['name']} 空调开关"
+    def __init__(self, coordinator, config_entry, device_state):
+        super().__init__(coordinator, config_entry, device_state)
+        self._attr_unique_id = f"bemfa_{device_state.topic}_ac_switch"
+        self._attr_name = f"{device_state.name} 空调开关"
         self._attr_device_class = SwitchDeviceClass.SWITCH # 空调开关也使用通用开关图标
         self._update_state()
 
     def _update_state(self):
-        msg = self.device_data['msg']
-        self._attr_is_on = msg.get(ATTR_ON, False)
+        self._attr_is_on = bool(self.device_state.on)
         _LOGGER.debug("BemfaAirConditionerSwitch _update_state: %s is_on: %s", self.name, self.is_on)
 
     async def async_turn_on(self, **kwargs):
         _LOGGER.debug("BemfaAirConditionerSwitch async_turn_on called for %s", self.name)
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         success = await self.coordinator.async_send_command(topic, "on#1#25#1")
         if success:
-            self.device_data['msg'][ATTR_ON] = True
-            self.async_write_ha_state()
+            self._attr_is_on = True
+            # 空调实体直接使用开机命令中的状态，不再触发一次完整刷新
+            self.async_set_optimistic_state(
+                self.device_state.replace(on=True, mode=1, target_temperature=25, level=1)
+            )
             _LOGGER.debug("BemfaAirConditionerSwitch: %s 开启命令发送成功。", self.name)
-            for entity in self.coordinator.get_climate_entities_for_topic(topic):
-                entity.async_schedule_update_ha_state(True)
         else:
             _LOGGER.error("BemfaAirConditionerSwitch: %s 开启命令发送失败。", self.name)
 
     async def async_turn_off(self, **kwargs):
         _LOGGER.debug("BemfaAirConditionerSwitch async_turn_off called for %s", self.name)
-        topic = self.device_data['topic']
+        topic = self.device_state.topic
         success = await self.coordinator.async_send_command(topic, "off")
         if success:
-            self.device_data['msg'][ATTR_ON] = False
-            self.async_write_ha_state()
+            self._attr_is_on = False
+            self.async_set_optimistic_state(self.device_state.replace(on=False))
             _LOGGER.debug("BemfaAirConditionerSwitch: %s 关闭命令发送成功。", self.name)
-            for entity in self.coordinator.get_climate_entities_for_topic(topic):
-                entity.async_schedule_update_ha_state(True)
         else:
             _LOGGER.error("BemfaAirConditionerSwitch: %s 关闭命令发送失败。", self.name)
 
@@ -119,16 +116,18 @@ async def async_setup_entry(
     """设置巴法智能开关平台 (通用开关和空调开关)"""
     coordinator = hass.data[DOMAIN][config_entry.entry_id]
 
-    entities = []
-    for device_data in coordinator.data:
-        device_id = device_data.get('id')
-        if device_id == DEVICE_TYPE_OUTLET: # 插座
-            entities.append(BemfaSmartSwitch(coordinator, config_entry, device_data))
-        elif device_id == DEVICE_TYPE_SWITCH: # 普通开关
-             entities.append(BemfaSmartSwitch(coordinator, config_entry, device_data)) # 同样使用 BemfaSmartSwitch
-        elif device_id == DEVICE_TYPE_AIR_CONDITIONER: # 空调开关
-            if ATTR_ON in device_data.get('msg', {}):
-                entities.append(BemfaAirConditionerSwitch(coordinator, config_entry, device_data))
-
-    if entities:
-        async_add_entities(entities)
\ No newline at end of file
+    def _create_switch(device_state):
+        return [BemfaSmartSwitch(coordinator, config_entry, device_state)]
+
+    def _create_ac_switch(device_state): # 空调开关
+        if device_state.on is not None:
+            return [BemfaAirConditionerSwitch(coordinator, config_entry, device_state)]
+        return []
+
+    async_setup_device_entities(
+        coordinator, config_entry, async_add_entities, {
+            DEVICE_TYPE_OUTLET: _create_switch, # 插座
+            DEVICE_TYPE_SWITCH: _create_switch, # 普通开关同样使用 BemfaSmartSwitch
+            DEVICE_TYPE_AIR_CONDITIONER: _create_ac_switch,
+        }
+    )
\ No newline at end of file